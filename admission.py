@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+# Per-user token buckets: sustained requests per minute and burst size, per endpoint group
+RATE_LIMITS = {
+    "generate-quiz": (
+        float(os.getenv("RATE_LIMIT_QUIZ_PER_MINUTE", "6")),
+        int(os.getenv("RATE_LIMIT_QUIZ_BURST", "3")),
+    ),
+    "process-pdf": (
+        float(os.getenv("RATE_LIMIT_PROCESS_PDF_PER_MINUTE", "3")),
+        int(os.getenv("RATE_LIMIT_PROCESS_PDF_BURST", "2")),
+    ),
+}
+# Inference requests admitted at once (running plus waiting for an executor thread)
+INFERENCE_QUEUE_MAX = int(os.getenv("INFERENCE_QUEUE_MAX", "8"))
+# Starting guess for one request's service time, refined from observed durations
+INFERENCE_SECONDS_ESTIMATE = float(os.getenv("INFERENCE_SECONDS_ESTIMATE", "30"))
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`; each request takes one token."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """Token bucket per (user, endpoint group); idle buckets are dropped once max_keys is reached."""
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None, max_keys: int = 10000):
+        self.limits = limits if limits is not None else RATE_LIMITS
+        self.max_keys = max_keys
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id: str, endpoint: str) -> float:
+        """0 when the request may proceed, otherwise the Retry-After in seconds"""
+        if endpoint not in self.limits:
+            return 0.0
+        per_minute, burst = self.limits[endpoint]
+        if per_minute <= 0:
+            return 0.0
+        with self._lock:
+            key = (user_id, endpoint)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune()
+                bucket = self._buckets[key] = TokenBucket(per_minute / 60.0, max(1, burst))
+            return bucket.try_acquire()
+
+    def _prune(self):
+        for key in [k for k, bucket in self._buckets.items() if bucket.is_full()]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class InferenceQueue:
+    """
+    Bounded admission for inference work. Requests beyond max_pending are refused up front
+    instead of queueing behind minutes of CPU work; the estimated wait is what a new request
+    would spend behind the ones already admitted, from a moving average of service time.
+    """
+
+    def __init__(self, max_pending: int = INFERENCE_QUEUE_MAX, workers: int = 1,
+                 seconds_estimate: float = INFERENCE_SECONDS_ESTIMATE, smoothing: float = 0.2):
+        self.max_pending = max_pending
+        self.workers = max(1, workers)
+        self.avg_seconds = seconds_estimate
+        self.smoothing = smoothing
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self.max_pending > 0 and self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            return True
+
+    def has_room(self) -> bool:
+        with self._lock:
+            return self.max_pending <= 0 or self.pending < self.max_pending
+
+    def leave(self, duration_seconds: Optional[float] = None):
+        with self._lock:
+            self.pending = max(0, self.pending - 1)
+            if duration_seconds is not None:
+                self.avg_seconds += self.smoothing * (duration_seconds - self.avg_seconds)
+
+    def estimated_wait(self) -> float:
+        with self._lock:
+            return max(0, self.pending + 1 - self.workers) / self.workers * self.avg_seconds
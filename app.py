@@ -2,10 +2,21 @@ import os
 import shutil
 import uvicorn
 import hashlib
+import io
+import base64
+from collections import OrderedDict
+from urllib.parse import quote
+import uuid
 import json
-from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException, Depends, status
+import math
+import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException, Depends, status, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -15,14 +26,38 @@ from pydantic import BaseModel, Field, EmailStr
 import beanie
 from typing import List
 from typing import List, Optional
-from beanie import PydanticObjectId
+from beanie import PydanticObjectId, UpdateResponse
+from beanie.operators import In, Inc, Set
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from starlette.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import aioodbc
-from typing import List, Optional 
-from fastapi import Query
+from typing import List, Optional, Literal, Union
+from fastapi import Query, Header
 import sys
 import importlib.util
+from pipeline import (
+    Stage, Deadline, CancellationToken, StageCancelled, run_stages,
+    STATUS_OK, STATUS_ERROR, STATUS_TIMEOUT, STATUS_CANCELLED,
+)
+from metrics import metrics
+from write_behind import WriteBehindBuffer
+from pubsub import create_bus
+from near_duplicates import NEAR_DUPLICATE_THRESHOLD, estimate_similarity, text_signature
+from admission import RATE_LIMITS, InferenceQueue, RateLimiter
+from preload import memory_usage
+from storage import (
+    StagedFile, UploadTooLarge, UPLOAD_MAX_BYTES, blob_path, buffer_upload, commit_staged, discard_staged, file_extension,
+    remove_blob_file, stage_upload, sweep_stale_temp, write_chunk
+)
+from inference_server import (
+    INFERENCE_SERVER_ADDRESSES, InferenceClient, RemoteKeywordExtractor, RemoteQuizGenerator, RemoteSummarizer
+)
+from question_bank import (
+    QUESTION_BANK_SIZE, build_question_bank, compute_file_hash, sample_balanced
+)
 
 # Import quiz generator from make_quiz.py
 try:
@@ -83,6 +118,34 @@ MONGO_CONNECTION_STRING = "mongodb://localhost:27017"
 DB_NAME = "UniHub_Courses"
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Content-addressed, deduplicated file storage: uploads/blobs/ab/cd/<sha256><ext>
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+BLOB_GC_INTERVAL_SECONDS = float(os.getenv("BLOB_GC_INTERVAL_SECONDS", "3600"))
+# Unreferenced blobs are kept this long before deletion, so a re-upload can revive them
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+BLOB_ACQUIRE_ATTEMPTS = 5
+# Resumable uploads: suggested chunk size and how long an idle session is kept
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_SECONDS = float(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+# Downloads: "nginx" answers with X-Accel-Redirect, "sendfile" with X-Sendfile (Apache/lighttpd),
+# anything else streams the file from here. DOWNLOAD_ACCEL_PREFIX is the internal location
+# the proxy maps to the uploads directory.
+DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "").lower()
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "/protected-uploads/")
+DOWNLOAD_CACHE_SECONDS = int(os.getenv("DOWNLOAD_CACHE_SECONDS", str(365 * 24 * 3600)))
+DOWNLOAD_LINK_EXPIRE_SECONDS = int(os.getenv("DOWNLOAD_LINK_EXPIRE_SECONDS", "300"))
+# Live vote/comment events: documents one stream may watch, and the keep-alive interval
+LIVE_EVENTS_MAX_DOCUMENTS = int(os.getenv("LIVE_EVENTS_MAX_DOCUMENTS", "200"))
+LIVE_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("LIVE_EVENTS_HEARTBEAT_SECONDS", "15"))
+# Comments: page size limits and the per-process cache of first pages for hot documents
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_PAGE_MAX = 100
+COMMENT_CACHE_SIZE = int(os.getenv("COMMENT_CACHE_SIZE", "256"))
+# Bounds how stale another worker's cached first page can be after a new comment
+COMMENT_CACHE_TTL_SECONDS = float(os.getenv("COMMENT_CACHE_TTL_SECONDS", "30"))
+# Filter sidebar: values returned per facet, most common first
+FACET_LIMIT = int(os.getenv("FACET_LIMIT", "50"))
+FACET_FIELDS = ("university", "faculty", "course", "documentType")
 
 # --- SQL Server Configuration (for Users) ---
 SQL_SERVER_HOST = os.getenv("SQL_SERVER_HOST", r"localhost")
@@ -97,6 +160,23 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production"
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# --- AI Configuration ---
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "2"))
+BACKGROUND_INFERENCE_THREADS = int(os.getenv("BACKGROUND_INFERENCE_THREADS", "1"))
+STREAM_FIRST_BATCH = int(os.getenv("STREAM_FIRST_BATCH", "1"))  # concepts answered before the first streamed question
+QUIZ_STAGE_BATCH = int(os.getenv("QUIZ_STAGE_BATCH", "3"))  # concepts per batch in process-pdf, kept on a timeout
+QUESTION_BANK_PREFILL_ON_UPLOAD = os.getenv("QUESTION_BANK_PREFILL_ON_UPLOAD", "false").lower() == "true"
+# Compare each uploaded PDF's text against earlier uploads (see near_duplicates.py)
+NEAR_DUPLICATE_ON_UPLOAD = os.getenv("NEAR_DUPLICATE_ON_UPLOAD", "true").lower() == "true"
+PROCESS_PDF_DEADLINE_SECONDS = float(os.getenv("PROCESS_PDF_DEADLINE_SECONDS", "180"))
+QUIZ_DEADLINE_SECONDS = float(os.getenv("QUIZ_DEADLINE_SECONDS", "120"))
+# Share of the request deadline each stage may use (stages can overlap, so shares need not sum to 1)
+STAGE_BUDGET_SHARES = {"extract": 0.1, "summary": 0.5, "keywords": 0.2, "quiz": 0.4}
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+STATUS_DISCONNECTED = "disconnected"
+# Models to load and run once at startup ("quiz,summary,keywords"); /api/ready reports 503 until done
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "").split(",") if m.strip()]
+
 
 # --- Model for MongoDB (Document) ---
 class Document(beanie.Document):
@@ -115,8 +195,81 @@ class Document(beanie.Document):
     uploaded_by: Optional[str] = Field(default=None, index=True)  # User ID who uploaded
     summary: Optional[str] = Field(default=None)  # AI-generated summary
     keywords: List[str] = Field(default_factory=list)  # Extracted keywords
+    file_hash: Optional[str] = Field(default=None, index=True)  # SHA-256 of the stored file
+    duplicate_of: Optional[str] = Field(default=None, index=True)  # Earlier document with near-identical text
+    duplicate_similarity: Optional[float] = None  # Estimated Jaccard similarity to the closest earlier upload
+    vote_count: int = 0  # Kept in step with Votes by toggle_vote
+    comment_count: int = 0  # Kept in step with Comments by create_comment
     class Settings:
         name = "Courses"
+        indexes = [
+            [("university", 1), ("faculty", 1), ("course", 1)],
+            [("documentType", 1)],
+        ]
+
+# --- Model for MongoDB (TextSignature) ---
+class TextSignature(beanie.Document):
+    document_id: str
+    file_hash: Optional[str] = None
+    signature: List[int] = Field(default_factory=list)  # MinHash of the extracted text's shingles
+    bands: List[str] = Field(default_factory=list)  # LSH band keys; multikey index for candidate lookup
+    duplicate_of: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    class Settings:
+        name = "TextSignatures"
+        indexes = [
+            IndexModel([("document_id", 1)], unique=True),
+            [("bands", 1)],
+        ]
+
+# --- Model for MongoDB (QuestionBank) ---
+class QuestionBank(beanie.Document):
+    file_hash: str = Field(..., index=True)
+    document_id: Optional[str] = Field(default=None, index=True)
+    questions: List[dict] = Field(default_factory=list)  # Full quiz entries: options, answer label, concept, type
+    target_size: int = 0  # num_questions the bank was filled with
+    updated_at: datetime = Field(default_factory=datetime.now)
+    class Settings:
+        name = "QuestionBanks"
+
+# --- Model for MongoDB (Blob) ---
+class Blob(beanie.Document):
+    sha256: str  # Documents reference their blob through Document.file_hash
+    path: str
+    size_bytes: int
+    content_type: Optional[str] = None
+    ref_count: int = 0  # Number of Documents stored in this blob
+    created_at: datetime = Field(default_factory=datetime.now)
+    released_at: Optional[datetime] = None  # When ref_count last dropped to zero
+    deleting: bool = False  # Claimed by garbage collection; the file may already be gone
+    class Settings:
+        name = "Blobs"
+        indexes = [
+            IndexModel([("sha256", 1)], unique=True),
+            [("ref_count", 1), ("released_at", 1)],  # Garbage collection scan
+        ]
+
+# --- Model for MongoDB (UploadSession) ---
+class UploadSession(beanie.Document):
+    upload_id: str  # Random token the client uses in the chunk URLs
+    temp_path: str
+    filename: str
+    content_type: Optional[str] = None
+    size_bytes: int
+    offset: int = 0  # Bytes received and verified so far
+    status: str = "uploading"  # uploading -> finalizing -> complete
+    expected_sha256: Optional[str] = None
+    fields: dict = Field(default_factory=dict)  # Document metadata given at init
+    uploaded_by: Optional[str] = None
+    document_id: Optional[str] = None  # Set once finalized, so a repeated finalize is answered the same way
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+    class Settings:
+        name = "UploadSessions"
+        indexes = [
+            IndexModel([("upload_id", 1)], unique=True),
+            [("updated_at", 1)],  # Expiry scan
+        ]
 
 # --- Model for MongoDB (Comment) ---
 class Comment(beanie.Document):
@@ -127,6 +280,9 @@ class Comment(beanie.Document):
     created_at: datetime = Field(default_factory=datetime.now)
     class Settings:
         name = "Comments"
+        indexes = [
+            [("document_id", 1), ("created_at", -1), ("_id", -1)],  # Newest-first pages per document
+        ]
 
 # --- Model for MongoDB (Vote) ---
 class Vote(beanie.Document):
@@ -136,7 +292,7 @@ class Vote(beanie.Document):
     class Settings:
         name = "Votes"
         indexes = [
-            [("document_id", 1), ("user_id", 1)],  # Compound index to prevent duplicate votes
+            IndexModel([("document_id", 1), ("user_id", 1)], unique=True),  # Prevents duplicate votes
         ]
 
 # --- Model for MongoDB (Download) ---
@@ -147,7 +303,7 @@ class Download(beanie.Document):
     class Settings:
         name = "Downloads"
         indexes = [
-            [("document_id", 1), ("user_id", 1)],  # Compound index
+            IndexModel([("document_id", 1), ("user_id", 1)], unique=True),  # One record per user and document
         ]
 
 # --- Model for MongoDB (Favorite) ---
@@ -158,7 +314,7 @@ class Favorite(beanie.Document):
     class Settings:
         name = "Favorites"
         indexes = [
-            [("document_id", 1), ("user_id", 1)],  # Compound index to prevent duplicate favorites
+            IndexModel([("document_id", 1), ("user_id", 1)], unique=True),  # Prevents duplicate favorites
         ]
 
 # --- Models for SQL Server (User) ---
@@ -327,6 +483,14 @@ async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCrede
     except HTTPException:
         return None
 
+async def init_mongo(client: AsyncIOMotorClient):
+    for collection_name in (Vote.Settings.name, Download.Settings.name, Favorite.Settings.name):
+        await prepare_unique_pair_index(client[DB_NAME][collection_name])
+    await beanie.init_beanie(
+        database=client[DB_NAME],
+        document_models=[Document, Comment, Vote, Download, Favorite, QuestionBank, Blob, UploadSession, TextSignature]
+    )
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Bắt đầu khởi động server...")
@@ -334,10 +498,7 @@ async def lifespan(app: FastAPI):
 
     # Connect MongoDB (Beanie)
     app.mongodb_client = AsyncIOMotorClient(MONGO_CONNECTION_STRING)
-    await beanie.init_beanie(
-        database=app.mongodb_client[DB_NAME],
-        document_models=[Document, Comment, Vote, Download, Favorite] 
-    )
+    await init_mongo(app.mongodb_client)
     print(f" Collection Beanie và MongoDB sucessful!")
     print(f"   - Database: {DB_NAME}")
     print(f"   - Collection: {Document.Settings.name}")
@@ -365,10 +526,31 @@ async def lifespan(app: FastAPI):
         print(f"Error connecting to SQL Server: {e}")
         pool = None 
 
+    # Warm up in the background so the API starts serving non-AI routes right away
+    warmup_task = asyncio.create_task(warm_up_models()) if WARMUP_MODELS else None
+    blob_gc_task = asyncio.create_task(run_blob_gc_periodically()) if BLOB_GC_INTERVAL_SECONDS > 0 else None
+    write_behind_tasks = [asyncio.create_task(download_writes.run())]
+    try:
+        await event_bus.start()
+    except Exception as e:
+        print(f"Error starting event bus: {e}")
+
     yield 
 
+    for task in (warmup_task, blob_gc_task, *write_behind_tasks):
+        if task and not task.done():
+            task.cancel()
+
     print("Starting to shut down the server...")
     
+    await event_bus.stop()
+
+    # Buffered tracking writes must reach MongoDB before the client closes
+    try:
+        await download_writes.flush()
+    except Exception as e:
+        print(f"Error flushing download writes on shutdown: {e}")
+    
     app.mongodb_client.close()
     print("Disconnected from MongoDB.")
 
@@ -377,6 +559,9 @@ async def lifespan(app: FastAPI):
         await pool.wait_closed()
         print("Disconnected from SQL Server")
 
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+    background_executor.shutdown(wait=False, cancel_futures=True)
+
 
 app = FastAPI(
     title="UniHub API", 
@@ -393,10 +578,120 @@ app.add_middleware(
 )
 
 
+# --- Blob storage ---
+
+async def acquire_blob(staged: StagedFile, content_type: Optional[str], keep_staged: bool = False) -> Blob:
+    """Add a reference to the blob holding the staged content (creating it on first upload)
+    and move the staged file into place; duplicate content just drops the staged copy.
+    On failure the staged file is left for the caller to retry with or discard; with
+    keep_staged it is linked into place rather than moved, and kept after success too."""
+    for attempt in range(BLOB_ACQUIRE_ATTEMPTS):
+        try:
+            # A blob claimed by garbage collection is never revived; once GC has removed its
+            # file and record, the insert below creates it afresh and commits the new file
+            blob = await Blob.find_one(Blob.sha256 == staged.sha256, Blob.deleting != True).upsert(
+                Inc({Blob.ref_count: 1}), Set({Blob.released_at: None}),
+                on_insert=Blob(
+                    sha256=staged.sha256,
+                    path=blob_path(BLOB_DIR, staged.sha256, staged.extension),
+                    size_bytes=staged.size,
+                    content_type=content_type,
+                    ref_count=1
+                ),
+                response_type=UpdateResponse.NEW_DOCUMENT
+            )
+            break
+        except DuplicateKeyError:
+            # Another upload of the same content inserted it first (the retry increments it),
+            # or GC is deleting the old blob and will drop its record right after the file
+            if attempt == BLOB_ACQUIRE_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(0.05 * attempt)
+    if blob.ref_count > 1:
+        metrics.incr("blob_dedup_hits_total")
+        metrics.incr("blob_dedup_saved_bytes_total", staged.size)
+    try:
+        await run_in_threadpool(commit_staged, staged.temp_path, blob.path, keep_staged)
+    except Exception:
+        await release_blob(blob.sha256, blob.path)
+        raise
+    return blob
+
+async def release_blob(sha256: Optional[str], path: Optional[str]):
+    """Drop one reference; documents stored before blobs existed have no blob and are left alone"""
+    if not sha256:
+        return
+    blob = await Blob.find_one(Blob.sha256 == sha256, Blob.path == path).update(
+        Inc({Blob.ref_count: -1}), response_type=UpdateResponse.NEW_DOCUMENT
+    )
+    if blob and blob.ref_count <= 0:
+        await blob.set({Blob.released_at: datetime.now()})
+
+async def collect_blob_garbage() -> dict:
+    """Delete blobs that have had no references for BLOB_GC_GRACE_SECONDS, plus stale temp files"""
+    cutoff = datetime.now() - timedelta(seconds=BLOB_GC_GRACE_SECONDS)
+    deleted = freed = 0
+    async for blob in Blob.find(Blob.ref_count <= 0, Blob.released_at < cutoff):
+        # Claim first: a blob re-referenced since the scan is kept, and once claimed no upload
+        # can reference it, so the file goes before the record (a crash here is finished next run)
+        claimed = await Blob.find_one(Blob.id == blob.id, Blob.ref_count <= 0).update(
+            Set({Blob.deleting: True})
+        )
+        if not claimed or not claimed.matched_count:
+            continue
+        freed += await run_in_threadpool(remove_blob_file, blob.path)
+        await Blob.find_one(Blob.id == blob.id, Blob.deleting == True).delete()
+        deleted += 1
+    expired = 0
+    session_cutoff = datetime.now() - timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+    async for session in UploadSession.find(UploadSession.updated_at < session_cutoff):
+        if not session.document_id:
+            discard_staged(session.temp_path)
+        await session.delete()
+        expired += 1
+    swept = await run_in_threadpool(sweep_stale_temp, BLOB_DIR)
+    metrics.incr("blob_gc_deleted_total", deleted)
+    metrics.incr("blob_gc_freed_bytes_total", freed)
+    return {"deleted_blobs": deleted, "freed_bytes": freed, "expired_upload_sessions": expired, "stale_temp_files": swept}
+
+async def run_blob_gc_periodically():
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL_SECONDS)
+        try:
+            result = await collect_blob_garbage()
+            if any(result.values()):
+                print(f"Blob garbage collection: {result}")
+        except Exception as e:
+            print(f"Error collecting blob garbage: {e}")
+
+
+async def insert_uploaded_document(blob: Blob, filename: str, content_type: Optional[str], fields: dict,
+                                   uploaded_by: Optional[str], background_tasks: BackgroundTasks) -> "Document":
+    """Create the Document for a stored blob; shared by the multipart and resumable upload paths"""
+    doc = Document(
+        filename=filename,
+        saved_path=blob.path,
+        content_type=content_type,
+        size_bytes=blob.size_bytes,
+        uploaded_by=uploaded_by,
+        file_hash=blob.sha256,
+        **fields
+    )
+    try:
+        await doc.insert()
+    except Exception:
+        await release_blob(blob.sha256, blob.path)
+        raise
+    if (NEAR_DUPLICATE_ON_UPLOAD or QUESTION_BANK_PREFILL_ON_UPLOAD) and blob.path.lower().endswith('.pdf'):
+        background_tasks.add_task(process_uploaded_pdf, str(doc.id), blob.path, blob.sha256)
+    return doc
+
+
 # --- API for Document (MongoDB) ---
 
 @app.post("/uploadfile/")
 async def create_upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     university: str = Form(...),
     faculty: str = Form(...),
@@ -407,38 +702,34 @@ async def create_upload_file(
     tags: str = Form(default=""),
     current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
-    local_file_path = os.path.join(UPLOAD_DIR, file.filename)
-    db_save_path = os.path.join(UPLOAD_DIR, file.filename).replace("\\", "/")
+    # Streamed to a temp file off the event loop and hashed while writing, then stored once per content
     try:
-        with open(local_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        file_size = os.path.getsize(local_file_path) 
+        staged = await stage_upload(file, BLOB_DIR)
+        try:
+            blob = await acquire_blob(staged, file.content_type)
+        except BaseException:
+            discard_staged(staged.temp_path)
+            raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         return JSONResponse(status_code=500, content={"detail": f"Do not save: {e}"})
     finally:
-        file.file.close()
+        await file.close()
     
     # Get user ID if authenticated
     uploaded_by = None
     if current_user:
         uploaded_by = str(current_user["_id"])
     
-    doc = Document(
-        filename=file.filename,
-        saved_path=db_save_path,  
-        content_type=file.content_type,
-        size_bytes=file_size,
-        university = university,
-        faculty = faculty,
-        course = course,
-        documentTitle = documentTitle,
-        description = description,
-        documentType = documentType,
-        tags = tags,
-        uploaded_by = uploaded_by
+    fields = dict(
+        university=university, faculty=faculty, course=course, documentTitle=documentTitle,
+        description=description, documentType=documentType, tags=tags
     )
     try:
-        await doc.insert()
+        doc = await insert_uploaded_document(
+            blob, file.filename, file.content_type, fields, uploaded_by, background_tasks
+        )
         return JSONResponse(content={
             "status": "uploaded successfully",
             "filename": doc.filename, 
@@ -450,30 +741,344 @@ async def create_upload_file(
             "detail": f"File saved successfully but could not save to database: {e}"
         })
 
+@app.delete("/api/documents/{document_id}")
+async def delete_document(
+    document_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete one of the current user's documents; the file goes once no other document shares it"""
+    doc = await Document.get(PydanticObjectId(document_id)) if PydanticObjectId.is_valid(document_id) else None
+    if not doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    if doc.uploaded_by != str(current_user["_id"]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only delete your own documents"
+        )
+    await doc.delete()
+    await delete_document_dependents(doc)
+    await release_blob(doc.file_hash, doc.saved_path)
+    return {"status": "deleted", "document_id": document_id}
+
+async def delete_document_dependents(doc: "Document"):
+    """Remove what hangs off a deleted document and promote its oldest near-duplicate, if any,
+    to be the original the other duplicates point at"""
+    document_id = str(doc.id)
+    # Pending write-behind rows would otherwise be written after the delete
+    try:
+        await download_writes.flush()
+    except Exception as e:
+        print(f"Error flushing download writes before delete: {e}")
+    for model in (Comment, Vote, Download, Favorite, TextSignature):
+        await model.find(model.document_id == document_id).delete()
+    comment_first_pages.invalidate(document_id)
+
+    if doc.file_hash:
+        # Banks are shared by every document with the same file; keep it while one remains
+        other = await Document.find_one(Document.file_hash == doc.file_hash)
+        if other is None:
+            await QuestionBank.find(QuestionBank.file_hash == doc.file_hash).delete()
+        else:
+            await QuestionBank.find(QuestionBank.document_id == document_id).update(
+                Set({QuestionBank.document_id: str(other.id)})
+            )
+    await QuestionBank.find(QuestionBank.document_id == document_id).delete()
+
+    duplicates = await Document.find(Document.duplicate_of == document_id).sort(
+        "uploaded_at", "_id"
+    ).limit(1).to_list()
+    if duplicates:
+        new_original = str(duplicates[0].id)
+        await Document.find(Document.id == duplicates[0].id).update(
+            Set({Document.duplicate_of: None, Document.duplicate_similarity: None})
+        )
+        await Document.find(Document.duplicate_of == document_id).update(
+            Set({Document.duplicate_of: new_original})
+        )
+        await TextSignature.find(TextSignature.document_id == new_original).update(
+            Set({TextSignature.duplicate_of: None})
+        )
+        await TextSignature.find(TextSignature.duplicate_of == document_id).update(
+            Set({TextSignature.duplicate_of: new_original})
+        )
+
+# --- Resumable uploads ---
+# POST /api/uploads opens a session, PUT /api/uploads/{id}?offset=N appends the raw request
+# body, GET reports the committed offset to resume from, and finalize verifies the whole-file
+# hash and creates the Document exactly like /uploadfile/.
+
+class ResumableUploadInit(BaseModel):
+    filename: str
+    size_bytes: int
+    content_type: Optional[str] = None
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")  # Whole-file digest, checked at finalize
+    university: str
+    faculty: str
+    course: str
+    documentTitle: str
+    description: str
+    documentType: str
+    tags: str = ""
+
+def upload_session_status(session: UploadSession) -> dict:
+    return {
+        "upload_id": session.upload_id,
+        "filename": session.filename,
+        "size_bytes": session.size_bytes,
+        "offset": session.offset,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "status": session.status,
+        "document_id": session.document_id,
+    }
+
+async def get_upload_session(upload_id: str, current_user: Optional[dict]) -> UploadSession:
+    session = await UploadSession.find_one(UploadSession.upload_id == upload_id)
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found or expired")
+    if session.uploaded_by and (not current_user or session.uploaded_by != str(current_user["_id"])):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="This upload belongs to another user")
+    return session
+
+@app.post("/api/uploads")
+async def create_upload_session(
+    request: ResumableUploadInit,
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    """Open a resumable upload; the client then PUTs chunks starting at offset 0"""
+    if request.size_bytes <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="size_bytes must be positive")
+    if UPLOAD_MAX_BYTES and request.size_bytes > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=str(UploadTooLarge(UPLOAD_MAX_BYTES)))
+    upload_id = uuid.uuid4().hex
+    tmp_dir = os.path.join(BLOB_DIR, "tmp")
+    temp_path = os.path.join(tmp_dir, f"{upload_id}.part").replace("\\", "/")
+    def create_empty():
+        os.makedirs(tmp_dir, exist_ok=True)
+        open(temp_path, "wb").close()
+    await run_in_threadpool(create_empty)
+    session = UploadSession(
+        upload_id=upload_id,
+        temp_path=temp_path,
+        filename=request.filename,
+        content_type=request.content_type or "application/octet-stream",
+        size_bytes=request.size_bytes,
+        expected_sha256=request.sha256.lower(),
+        fields=request.model_dump(include={
+            "university", "faculty", "course", "documentTitle", "description", "documentType", "tags"
+        }),
+        uploaded_by=str(current_user["_id"]) if current_user else None,
+    )
+    await session.insert()
+    metrics.incr("resumable_uploads_started_total")
+    return upload_session_status(session)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_status(
+    upload_id: str,
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    """Committed offset to resume from after a dropped connection"""
+    session = await get_upload_session(upload_id, current_user)
+    return JSONResponse(content=upload_session_status(session),
+                        headers={"Upload-Offset": str(session.offset)})
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    raw_request: Request,
+    offset: int = Query(..., ge=0),
+    chunk_sha256: str = Header(..., alias="X-Chunk-SHA256"),
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    """Write the request body at offset. Only the next expected offset is accepted (409 with the
+    current Upload-Offset otherwise), so a retried chunk can never leave a gap or a duplicate."""
+    session = await get_upload_session(upload_id, current_user)
+    if session.status != "uploading":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Upload is {session.status}")
+    if offset != session.offset:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Expected offset {session.offset}",
+            headers={"Upload-Offset": str(session.offset)}
+        )
+    try:
+        written, digest = await write_chunk(session.temp_path, offset, raw_request.stream(), session.size_bytes)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"Chunk runs past the declared size of {session.size_bytes} bytes")
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload data expired; start a new upload")
+    if chunk_sha256.lower() != digest:
+        metrics.incr("resumable_upload_chunk_mismatch_total")
+        raise HTTPException(
+            status_code=422,
+            detail="Chunk checksum mismatch; resend it",
+            headers={"Upload-Offset": str(session.offset)}
+        )
+    # Advance only if nobody else committed this offset meanwhile
+    result = await UploadSession.find_one(
+        UploadSession.upload_id == upload_id,
+        UploadSession.offset == offset,
+        UploadSession.status == "uploading"
+    ).update(Set({UploadSession.offset: offset + written, UploadSession.updated_at: datetime.now()}))
+    if not result or not result.modified_count:
+        current = await UploadSession.find_one(UploadSession.upload_id == upload_id)
+        current_offset = current.offset if current else session.offset
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Expected offset {current_offset}",
+            headers={"Upload-Offset": str(current_offset)}
+        )
+    metrics.incr("resumable_upload_bytes_total", written)
+    session.offset = offset + written
+    return JSONResponse(content=upload_session_status(session),
+                        headers={"Upload-Offset": str(session.offset)})
+
+@app.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    """Verify the assembled file and create its Document; repeating it returns the same document"""
+    session = await get_upload_session(upload_id, current_user)
+    if session.status == "complete":
+        return upload_session_status(session)
+    if session.offset != session.size_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: {session.offset} of {session.size_bytes} bytes received",
+            headers={"Upload-Offset": str(session.offset)}
+        )
+    claimed = await UploadSession.find_one(
+        UploadSession.upload_id == upload_id, UploadSession.status == "uploading"
+    ).update(Set({UploadSession.status: "finalizing", UploadSession.updated_at: datetime.now()}))
+    if not claimed or not claimed.modified_count:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is already being finalized")
+
+    try:
+        file_hash = await run_in_threadpool(compute_file_hash, session.temp_path)
+    except OSError:
+        await session.delete()
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload data expired; start a new upload")
+    if session.expected_sha256 and file_hash != session.expected_sha256:
+        metrics.incr("resumable_upload_hash_mismatch_total")
+        discard_staged(session.temp_path)
+        await session.delete()
+        raise HTTPException(status_code=422, detail="File checksum mismatch; the upload was discarded")
+
+    try:
+        staged = StagedFile(session.temp_path, file_hash, session.size_bytes, file_extension(session.filename))
+        # The session's file stays until the Document exists, so a failed finalize can be retried
+        blob = await acquire_blob(staged, session.content_type, keep_staged=True)
+        doc = await insert_uploaded_document(
+            blob, session.filename, session.content_type, session.fields, session.uploaded_by, background_tasks
+        )
+    except Exception as e:
+        print(f"Error finalizing upload {upload_id}: {e}")
+        if os.path.exists(session.temp_path):
+            await UploadSession.find_one(UploadSession.upload_id == upload_id).update(
+                Set({UploadSession.status: "uploading"})
+            )
+        else:
+            await session.delete()
+        return JSONResponse(status_code=500, content={"detail": f"Could not save upload: {e}"})
+
+    discard_staged(session.temp_path)
+    session.status = "complete"
+    session.document_id = str(doc.id)
+    session.updated_at = datetime.now()
+    await session.save()
+    metrics.incr("resumable_uploads_completed_total")
+    return {**upload_session_status(session), "filename": doc.filename, "mongo_id": str(doc.id)}
+
+def document_filter(university: Optional[str] = None, faculty: Optional[str] = None,
+                    course: Optional[str] = None, documentType: Optional[str] = None,
+                    tag: Optional[str] = None, include_duplicates: bool = True) -> dict:
+    """MongoDB criteria for the catalog filters shared by the listing and its facet counts"""
+    search_criteria = {}
+    if university:
+        search_criteria["university"] = university
+    if faculty:
+        search_criteria["faculty"] = faculty
+    if course:
+        search_criteria["course"] = course
+    if documentType:
+        search_criteria["documentType"] = documentType
+    if tag:
+        # tags is stored as a comma-separated string; match one whole entry of it
+        search_criteria["tags"] = {"$regex": rf"(^|,)\s*{re.escape(tag.strip())}\s*(,|$)"}
+    if not include_duplicates:
+        search_criteria["duplicate_of"] = None
+    return search_criteria
+
+def facet_counts(field_path: str) -> list:
+    """$facet sub-pipeline: [{_id: value, count}] for one field, most common first"""
+    return [
+        {"$group": {"_id": field_path, "count": {"$sum": 1}}},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": FACET_LIMIT},
+    ]
+
+@app.get("/documents/facets")
+async def get_document_facets(
+    university: Optional[str] = Query(None),
+    faculty: Optional[str] = Query(None),
+    course: Optional[str] = Query(None),
+    documentType: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None),
+    include_duplicates: bool = Query(True)
+):
+    """
+    Counts per university, faculty, course, documentType and tag for the documents matching
+    the same filters as /documents/, computed in one aggregation so filter sidebars don't
+    need the whole catalog.
+    """
+    try:
+        facets = {field: facet_counts(f"${field}") for field in FACET_FIELDS}
+        facets["tags"] = [
+            {"$project": {"tag": {"$split": [{"$ifNull": ["$tags", ""]}, ","]}}},
+            {"$unwind": "$tag"},
+            {"$project": {"tag": {"$trim": {"input": "$tag"}}}},
+            *facet_counts("$tag"),
+        ]
+        facets["total"] = [{"$count": "count"}]
+        criteria = document_filter(university, faculty, course, documentType, tag, include_duplicates)
+        rows = await Document.aggregate([{"$match": criteria}, {"$facet": facets}]).to_list()
+        row = rows[0] if rows else {}
+        total = row.get("total") or [{"count": 0}]
+        return {
+            "total": total[0]["count"],
+            "facets": {
+                name: [{"value": item["_id"], "count": item["count"]} for item in row.get(name, [])]
+                for name in (*FACET_FIELDS, "tags")
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/documents/")  # Removed response_model to allow custom fields
 async def get_all_documents(
     university: Optional[str] = Query(None),
     faculty: Optional[str] = Query(None),
-    course: Optional[str] = Query(None)
+    course: Optional[str] = Query(None),
+    documentType: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None),
+    include_duplicates: bool = Query(True)
 ):
     """
     Get documents in the 'Courses' collection.
-    Can be filtered by university, faculty, or course using query parameters.
-    (e.g., /documents/?course=CS101)
+    Can be filtered by university, faculty, course, documentType or a single tag.
+    (e.g., /documents/?course=CS101; include_duplicates=false hides near-duplicate uploads)
     """
     try:
-        # 1. Create an empty dictionary to hold search criteria
-        search_criteria = {}
-
-        # 2. Add criteria if they are provided
-        if university:
-            search_criteria["university"] = university
-        if faculty:
-            search_criteria["faculty"] = faculty
-        if course:
-            search_criteria["course"] = course
+        # 1. Build the search criteria from the filters that were provided
+        search_criteria = document_filter(university, faculty, course, documentType, tag, include_duplicates)
 
-        # 3. Search
+        # 2. Search
         if search_criteria:
             # If there are filters, search by criteria
             courses = await Document.find(search_criteria).to_list()
@@ -481,7 +1086,7 @@ async def get_all_documents(
             # If no filters, get all
             courses = await Document.find_all().to_list()
         
-        # 4. Convert to list of dictionaries and ensure id is included
+        # 3. Convert to list of dictionaries and ensure id is included
         result = []
         for doc in courses:
             # Get base dictionary from document
@@ -490,17 +1095,9 @@ async def get_all_documents(
             doc_id = str(doc.id)
             
             # Get vote count and comment count for priority calculation
-            try:
-                vote_count = await Vote.find(Vote.document_id == doc_id).count()
-            except Exception as e:
-                print(f"Error counting votes for {doc_id}: {e}")
-                vote_count = 0
+            vote_count = doc.vote_count  # Maintained by toggle_vote, no count query needed
             
-            try:
-                comment_count = await Comment.find(Comment.document_id == doc_id).count()
-            except Exception as e:
-                print(f"Error counting comments for {doc_id}: {e}")
-                comment_count = 0
+            comment_count = doc.comment_count
             
             # Ensure these are integers
             vote_count_int = int(vote_count) if vote_count else 0
@@ -524,7 +1121,7 @@ async def get_all_documents(
             
             result.append(final_dict)
         
-        # 5. Sort by priority score (highest first), then by upload date (newest first)
+        # 4. Sort by priority score (highest first), then by upload date (newest first)
         def get_sort_key(x):
             priority = -x.get('priority_score', 0)
             # Handle uploaded_at - could be datetime object or string
@@ -548,21 +1145,6 @@ async def get_all_documents(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Helper function to load comments from JSON file
-def load_comments_from_file(document_id: str) -> list:
-    """Load comments from JSON file"""
-    try:
-        COMMENTS_DIR = "public/data/comments"
-        comments_file = os.path.join(COMMENTS_DIR, f"{document_id}.json")
-        if os.path.exists(comments_file):
-            with open(comments_file, 'r', encoding='utf-8') as f:
-                comments_data = json.load(f)
-                return comments_data.get('comments', [])
-        return []
-    except Exception as e:
-        print(f"Error loading comments: {e}")
-        return []
-
 @app.get("/api/my-uploads")
 async def get_my_uploads(current_user: dict = Depends(get_current_user)):
     """Get all documents uploaded by the current user"""
@@ -576,15 +1158,9 @@ async def get_my_uploads(current_user: dict = Depends(get_current_user)):
             doc_id = str(doc.id)
             
             # Get vote and comment counts
-            try:
-                vote_count = await Vote.find(Vote.document_id == doc_id).count()
-            except:
-                vote_count = 0
+            vote_count = doc.vote_count
             
-            try:
-                comment_count = len(load_comments_from_file(doc_id))
-            except:
-                comment_count = 0
+            comment_count = doc.comment_count
             
             # Convert datetime to ISO string
             if 'uploaded_at' in doc_dict and isinstance(doc_dict['uploaded_at'], datetime):
@@ -607,6 +1183,7 @@ async def get_my_downloads(current_user: dict = Depends(get_current_user)):
     """Get all documents downloaded by the current user"""
     try:
         user_id = str(current_user["_id"])
+        await download_writes.flush()
         # Get all download records for this user
         downloads = await Download.find(Download.user_id == user_id).sort(-Download.downloaded_at).to_list()
         
@@ -626,15 +1203,9 @@ async def get_my_downloads(current_user: dict = Depends(get_current_user)):
                     doc_id_str = str(doc.id)
                     
                     # Get vote and comment counts
-                    try:
-                        vote_count = await Vote.find(Vote.document_id == doc_id_str).count()
-                    except:
-                        vote_count = 0
+                    vote_count = doc.vote_count
                     
-                    try:
-                        comment_count = len(load_comments_from_file(doc_id_str))
-                    except:
-                        comment_count = 0
+                    comment_count = doc.comment_count
                     
                     # Get download date for this user
                     user_download = next((d for d in downloads if d.document_id == doc_id), None)
@@ -687,15 +1258,9 @@ async def get_my_favorites(current_user: dict = Depends(get_current_user)):
                     doc_id_str = str(doc.id)
                     
                     # Get vote and comment counts
-                    try:
-                        vote_count = await Vote.find(Vote.document_id == doc_id_str).count()
-                    except:
-                        vote_count = 0
+                    vote_count = doc.vote_count
                     
-                    try:
-                        comment_count = len(load_comments_from_file(doc_id_str))
-                    except:
-                        comment_count = 0
+                    comment_count = doc.comment_count
                     
                     # Get favorite date for this user
                     user_favorite = next((f for f in favorites if f.document_id == doc_id), None)
@@ -724,6 +1289,63 @@ async def get_my_favorites(current_user: dict = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Write-behind tracking (Download) ---
+# Download clicks are buffered per (document, user) and flushed as unordered bulk upserts
+# against the unique (document_id, user_id) index, so a burst of clicks costs one round trip.
+# Favorites are toggles a user reads back at once, possibly from another worker, so they
+# are written through instead.
+
+async def bulk_write_ignoring_duplicates(model, operations: list):
+    """Unordered bulk write; an upsert racing another worker's insert (duplicate key) is fine"""
+    try:
+        await model.get_motor_collection().bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+async def flush_downloads(items):
+    operations = [
+        UpdateOne({"document_id": document_id, "user_id": user_id},
+                  {"$setOnInsert": {"downloaded_at": downloaded_at}}, upsert=True)
+        for (document_id, user_id), downloaded_at in items
+    ]
+    await bulk_write_ignoring_duplicates(Download, operations)
+    metrics.incr("download_writes_flushed_total", len(operations))
+
+download_writes = WriteBehindBuffer("download", flush_downloads)
+
+async def prepare_unique_pair_index(collection):
+    """Before init_beanie builds the unique (document_id, user_id) index: drop duplicate rows
+    and the older non-unique index on the same keys, which MongoDB would otherwise reject"""
+    pair_indexes = {}
+    for name, spec in (await collection.index_information()).items():
+        keys = [(field, int(direction)) for field, direction in spec["key"]]
+        if keys == [("document_id", 1), ("user_id", 1)]:
+            pair_indexes[name] = spec.get("unique", False)
+    if any(pair_indexes.values()):
+        return
+    duplicates = collection.aggregate([
+        {"$group": {"_id": {"document_id": "$document_id", "user_id": "$user_id"},
+                    "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+    async for group in duplicates:
+        await collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+    for name in pair_indexes:
+        try:
+            await collection.drop_index(name)
+        except OperationFailure as e:
+            # Every worker runs this at startup; another one may have dropped it already
+            if e.code != 27:  # IndexNotFound
+                raise
+            continue
+        print(f"Replaced non-unique index {name} on {collection.name}")
+
+async def record_download(document_id: str, user_id: str):
+    """Record that a user downloaded a document (once per user); written behind"""
+    key = (document_id, user_id)
+    download_writes.put(key, download_writes.get(key) or datetime.now())
+
 @app.post("/api/documents/{document_id}/download")
 async def track_download(
     document_id: str,
@@ -731,26 +1353,108 @@ async def track_download(
 ):
     """Track document download"""
     try:
-        user_id = str(current_user["_id"])
-        
-        # Check if download already exists
-        existing = await Download.find_one(
-            Download.document_id == document_id,
-            Download.user_id == user_id
-        )
-        
-        if not existing:
-            # Create new download record
-            download = Download(
-                document_id=document_id,
-                user_id=user_id
-            )
-            await download.insert()
-        
+        await record_download(document_id, str(current_user["_id"]))
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def download_token_user(token: Optional[str], document_id: str) -> Optional[str]:
+    """User id from a download link token issued for this document, or None"""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("purpose") != "download" or payload.get("doc") != document_id:
+        return None
+    return payload.get("sub")
+
+@app.post("/api/documents/{document_id}/download-link")
+async def create_download_link(
+    document_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Short-lived URL that downloads the file as this user. A plain navigation cannot send the bearer
+    token, so the link carries a signed token that lets the file endpoint record the Download.
+    """
+    token = create_access_token(
+        {"sub": str(current_user["_id"]), "doc": document_id, "purpose": "download"},
+        expires_delta=timedelta(seconds=DOWNLOAD_LINK_EXPIRE_SECONDS),
+    )
+    return {"url": f"/api/documents/{document_id}/file?download=1&token={token}"}
+
+def content_disposition(disposition: str, filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+@app.api_route("/api/documents/{document_id}/file", methods=["GET", "HEAD"])
+async def download_document_file(
+    document_id: str,
+    raw_request: Request,
+    download: bool = Query(False),
+    token: Optional[str] = Query(None),
+    current_user: Optional[dict] = Depends(get_current_user_optional)
+):
+    """
+    Serve a document's file with Range, ETag and cache headers. Stored files are content-addressed,
+    so the ETag is the SHA-256 and the bytes behind a URL never change. ?download=1 sends it as an
+    attachment and, on GET, records the Download for the user named by the bearer token or by a
+    ?token= from /download-link. An expired link still serves the file, unrecorded.
+    """
+    doc = await Document.get(PydanticObjectId(document_id)) if PydanticObjectId.is_valid(document_id) else None
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    try:
+        stat_result = await run_in_threadpool(os.stat, doc.saved_path)
+    except OSError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document file not found")
+
+    user_id = str(current_user["_id"]) if current_user else download_token_user(token, document_id)
+    record = download and user_id is not None
+    if record and raw_request.method == "GET":
+        # A resumed download (Range past the first byte) is the same download
+        range_header = raw_request.headers.get("range", "")
+        if not range_header or range_header.replace(" ", "").startswith("bytes=0-"):
+            await record_download(document_id, user_id)
+            metrics.incr("downloads_recorded_total")
+
+    etag = f'"{doc.file_hash}"' if doc.file_hash else f'"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    headers = {
+        "ETag": etag,
+        # Recorded downloads revalidate (a cheap 304) so each one still reaches the server
+        "Cache-Control": "private, no-cache" if record else f"public, max-age={DOWNLOAD_CACHE_SECONDS}, immutable",
+    }
+    if etag_matches(raw_request.headers.get("if-none-match"), etag):
+        metrics.incr("downloads_not_modified_total")
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = content_disposition("attachment" if download else "inline", doc.filename)
+    if DOWNLOAD_OFFLOAD in ("nginx", "sendfile"):
+        relative = os.path.relpath(doc.saved_path, UPLOAD_DIR).replace("\\", "/")
+        if DOWNLOAD_OFFLOAD == "nginx":
+            headers["X-Accel-Redirect"] = DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + relative
+        else:
+            headers["X-Sendfile"] = os.path.abspath(doc.saved_path)
+        # The proxy fills in the body, Content-Length and Range handling
+        metrics.incr("downloads_offloaded_total")
+        return Response(status_code=200, headers=headers, media_type=doc.content_type)
+
+    metrics.incr("downloads_served_total")
+    # FileResponse answers Range/If-Range itself and uses the server's pathsend extension
+    # (zero-copy) when it offers one
+    return FileResponse(doc.saved_path, headers=headers, media_type=doc.content_type, stat_result=stat_result)
+
 @app.post("/api/documents/{document_id}/favorite")
 async def toggle_favorite(
     document_id: str,
@@ -760,29 +1464,42 @@ async def toggle_favorite(
     try:
         user_id = str(current_user["_id"])
         
-        # Check if favorite already exists
-        existing = await Favorite.find_one(
+        # Unfavorite if a favorite exists, otherwise favorite; the unique (document_id, user_id)
+        # index decides the outcome atomically, whichever worker each click lands on
+        removed = await Favorite.find_one(
             Favorite.document_id == document_id,
             Favorite.user_id == user_id
-        )
-        
-        if existing:
-            # Remove favorite
-            await existing.delete()
+        ).delete()
+        if removed and removed.deleted_count:
             return {"status": "removed", "is_favorited": False}
-        else:
-            # Add favorite
-            favorite = Favorite(
-                document_id=document_id,
-                user_id=user_id
-            )
-            await favorite.insert()
-            return {"status": "added", "is_favorited": True}
+        try:
+            await Favorite(document_id=document_id, user_id=user_id).insert()
+        except DuplicateKeyError:
+            # A concurrent click already added it
+            pass
+        return {"status": "added", "is_favorited": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- API for User (SQL Server) ---
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Counters (e.g. cancelled inference work) and gauges for this worker process"""
+    publish_admission_metrics()
+    for key, value in memory_usage().items():
+        metrics.set_gauge(f"process_{key}_bytes", value)
+    return metrics.snapshot()
+
+@app.get("/api/ready")
+async def readiness_check():
+    """200 once the configured models are warmed up (or none are configured), 503 before that"""
+    body = {"ready": warmup_state["status"] in ("ready", "disabled"), **warmup_state}
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if body["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=body
+    )
+
 @app.get("/api/health")
 async def health_check():
     sql_server_connected = False
@@ -1054,19 +1771,164 @@ async def change_password(
             detail=f"Error changing password: {str(e)}"
         )
 
+# --- Live document events (Server-Sent Events) ---
+# Votes and comments are published on "document:<id>" channels; explore pages subscribe to
+# the documents they show and patch counts and comment lists in place.
+
+event_bus = create_bus()
+
+async def publish_document_event(document_id: str, kind: str, data: dict):
+    """Best effort: a failed publish never fails the vote or comment that caused it"""
+    try:
+        await event_bus.publish(f"document:{document_id}", {"type": kind, "document_id": document_id, **data})
+        metrics.incr("live_events_published_total")
+    except Exception as e:
+        print(f"Error publishing {kind} event for {document_id}: {e}")
+
+@app.get("/api/events/documents")
+async def stream_document_events(raw_request: Request, ids: str = Query(...)):
+    """Stream vote and comment events for a comma-separated list of document ids"""
+    document_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not document_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No document ids given")
+    if len(document_ids) > LIVE_EVENTS_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {LIVE_EVENTS_MAX_DOCUMENTS} documents per stream"
+        )
+    subscription = event_bus.subscribe(f"document:{document_id}" for document_id in document_ids)
+    metrics.set_gauge("live_event_subscribers", event_bus.subscriber_count())
+
+    async def events():
+        try:
+            yield sse_event("ready", {"documents": len(document_ids)})
+            while not await raw_request.is_disconnected():
+                item = await subscription.get(LIVE_EVENTS_HEARTBEAT_SECONDS)
+                if item is None:
+                    # Comment line: keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                _, event = item
+                yield sse_event(event["type"], event)
+        finally:
+            subscription.close()
+            metrics.set_gauge("live_event_subscribers", event_bus.subscriber_count())
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # --- API for Comments ---
 
+class FirstPageCache:
+    """LRU of each hot document's newest comments (one maximal page), dropped on new comments"""
+
+    def __init__(self, max_entries: int = COMMENT_CACHE_SIZE, ttl: float = COMMENT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._invalidated = OrderedDict()  # document_id -> (generation, monotonic time) of its last invalidate
+
+    def get(self, document_id: str):
+        entry = self._entries.get(document_id)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[document_id]
+            return None
+        self._entries.move_to_end(document_id)
+        return value
+
+    def generation(self) -> int:
+        """Read before fetching a page; pass to put() so a page raced by a new comment is not cached"""
+        return self._generation
+
+    def put(self, document_id: str, value, generation: int):
+        if self.max_entries <= 0:
+            return
+        invalidated = self._invalidated.get(document_id)
+        if invalidated is not None and invalidated[0] > generation:
+            return
+        self._entries[document_id] = (time.monotonic(), value)
+        self._entries.move_to_end(document_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, document_id: str):
+        self._entries.pop(document_id, None)
+        self._generation += 1
+        now = time.monotonic()
+        self._invalidated[document_id] = (self._generation, now)
+        self._invalidated.move_to_end(document_id)
+        # No fetch outlives the TTL, so older records can no longer veto a put
+        while self._invalidated and next(iter(self._invalidated.values()))[1] < now - self.ttl:
+            self._invalidated.popitem(last=False)
+
+comment_first_pages = FirstPageCache()
+
+def comment_to_dict(comment: "Comment") -> dict:
+    return {
+        "id": str(comment.id),
+        "author_name": comment.author_name,
+        "text": comment.text,
+        "created_at": comment.created_at.isoformat()
+    }
+
+def encode_comment_cursor(comment: dict) -> str:
+    """Opaque cursor: the (created_at, id) of the last comment on a page"""
+    return base64.urlsafe_b64encode(f"{comment['created_at']}|{comment['id']}".encode()).decode().rstrip("=")
+
+def decode_comment_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, comment_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), PydanticObjectId(comment_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+async def fetch_comment_page(document_id: str, limit: int, before=None) -> List[dict]:
+    """One indexed range query on (document_id, created_at, _id), newest first; the _id
+    tiebreak keeps comments with the same timestamp from being skipped or repeated"""
+    criteria = {"document_id": document_id}
+    if before is not None:
+        created_at, comment_id = before
+        criteria["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": comment_id}},
+        ]
+    comments = await Comment.find(criteria).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit).to_list()
+    return [comment_to_dict(comment) for comment in comments]
+
 @app.get("/api/documents/{document_id}/comments")
-async def get_comments(document_id: str):
-    """Get all comments for a document"""
+async def get_comments(
+    document_id: str,
+    limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=COMMENTS_PAGE_MAX),
+    before: Optional[str] = Query(None)
+):
+    """
+    Newest comments for a document, one page at a time. When more remain, the X-Next-Cursor
+    header holds the value to pass as ?before= for the next page.
+    """
     try:
-        comments = await Comment.find(Comment.document_id == document_id).sort(-Comment.created_at).to_list()
-        return [{
-            "id": str(comment.id),
-            "author_name": comment.author_name,
-            "text": comment.text,
-            "created_at": comment.created_at.isoformat()
-        } for comment in comments]
+        if before is None:
+            # First pages are cached one maximal page deep and sliced to the requested limit
+            page = comment_first_pages.get(document_id)
+            if page is None:
+                generation = comment_first_pages.generation()
+                page = await fetch_comment_page(document_id, COMMENTS_PAGE_MAX + 1)
+                comment_first_pages.put(document_id, page, generation)
+                metrics.incr("comment_page_cache_misses_total")
+            else:
+                metrics.incr("comment_page_cache_hits_total")
+        else:
+            page = await fetch_comment_page(document_id, limit + 1, decode_comment_cursor(before))
+        comments = page[:limit]
+        headers = {"X-Next-Cursor": encode_comment_cursor(comments[-1])} if len(page) > limit else {}
+        return JSONResponse(content=comments, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1084,16 +1946,7 @@ async def create_comment(
 ):
     """Create a new comment for a document"""
     try:
-        # Verify document exists
-        try:
-            doc = await Document.get(PydanticObjectId(document_id))
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Document not found"
-            )
-        
-        if not doc:
+        if not PydanticObjectId.is_valid(document_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
@@ -1108,12 +1961,21 @@ async def create_comment(
         )
         await comment.insert()
         
-        return {
-            "id": str(comment.id),
-            "author_name": comment.author_name,
-            "text": comment.text,
-            "created_at": comment.created_at.isoformat()
-        }
+        # Bump the cached count; this also tells us whether the document exists
+        doc = await Document.find_one(Document.id == PydanticObjectId(document_id)).update(
+            Inc({Document.comment_count: 1}), response_type=UpdateResponse.NEW_DOCUMENT
+        )
+        if doc is None:
+            await comment.delete()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        comment_first_pages.invalidate(document_id)
+        
+        result = comment_to_dict(comment)
+        await publish_document_event(document_id, "comment", {"comment": result, "comment_count": doc.comment_count})
+        return result
     except HTTPException:
         raise
     except Exception as e:
@@ -1124,12 +1986,47 @@ async def create_comment(
 
 # --- API for Votes ---
 
+async def reconcile_counts(model, field: str, document_ids: Optional[List[str]] = None) -> int:
+    """
+    Set a cached counter field to the true row count wherever they differ: fills in documents
+    stored before the field existed and repairs drift left by a failure between a row write and
+    its $inc. Covers just document_ids after such a failure, or every document when run as
+    `python app.py reconcile-counts`. Each counter is read before its rows are counted and only
+    set if it still holds that value, so an $inc that lands meanwhile is not overwritten.
+    """
+    criteria = {} if document_ids is None else {
+        "_id": {"$in": [PydanticObjectId(i) for i in document_ids if PydanticObjectId.is_valid(i)]}
+    }
+    collection = Document.get_motor_collection()
+    rows = model.get_motor_collection()
+    fixed = 0
+    async for doc in collection.find(criteria, {field: 1}):
+        current = doc.get(field)
+        expected = await rows.count_documents({"document_id": str(doc["_id"])})
+        if current != expected:
+            # {field: None} also matches documents stored before the field existed
+            result = await collection.update_one({"_id": doc["_id"], field: current}, {"$set": {field: expected}})
+            fixed += result.modified_count
+    if fixed:
+        print(f"Reconciled {field} for {fixed} documents")
+    return fixed
+
+async def reconcile_all_counts():
+    """One-off repair of every cached counter, run outside the API workers"""
+    client = AsyncIOMotorClient(MONGO_CONNECTION_STRING)
+    try:
+        await init_mongo(client)
+        await reconcile_counts(Vote, "vote_count")
+        await reconcile_counts(Comment, "comment_count")
+    finally:
+        client.close()
+
 @app.get("/api/documents/{document_id}/votes")
 async def get_vote_count(document_id: str):
     """Get vote count for a document"""
     try:
-        vote_count = await Vote.find(Vote.document_id == document_id).count()
-        return {"vote_count": vote_count}
+        doc = await Document.get(PydanticObjectId(document_id)) if PydanticObjectId.is_valid(document_id) else None
+        return {"vote_count": doc.vote_count if doc else 0}
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1159,40 +2056,50 @@ async def toggle_vote(
     document_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Toggle vote for a document (vote if not voted, unvote if voted)"""
+    """
+    Toggle vote for a document (vote if not voted, unvote if voted).
+    The unique (document_id, user_id) index makes the delete-or-insert decide the outcome
+    atomically, and the document's vote_count moves with it in one $inc that returns the new
+    value, so double clicks can't double count and nothing is recounted.
+    """
     try:
-        # Verify document exists
-        try:
-            doc = await Document.get(PydanticObjectId(document_id))
-        except:
+        if not PydanticObjectId.is_valid(document_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
-        
         user_id = str(current_user["_id"])
         
-        # Check if user already voted
-        existing_vote = await Vote.find_one(
-            Vote.document_id == document_id,
-            Vote.user_id == user_id
-        )
-        
-        if existing_vote:
-            # Unvote: remove the vote
-            await existing_vote.delete()
-            action = "unvoted"
+        # Unvote if a vote exists, otherwise vote
+        removed = await Vote.find_one(Vote.document_id == document_id, Vote.user_id == user_id).delete()
+        if removed and removed.deleted_count:
+            action, delta = "unvoted", -1
         else:
-            # Vote: create new vote
-            vote = Vote(
-                document_id=document_id,
-                user_id=user_id
-            )
-            await vote.insert()
-            action = "voted"
+            try:
+                await Vote(document_id=document_id, user_id=user_id).insert()
+                action, delta = "voted", 1
+            except DuplicateKeyError:
+                # A concurrent click already inserted this vote and counted it
+                action, delta = "voted", 0
         
-        # Get updated vote count
-        vote_count = await Vote.find(Vote.document_id == document_id).count()
+        try:
+            doc = await Document.find_one(Document.id == PydanticObjectId(document_id)).update(
+                Inc({Document.vote_count: delta}), response_type=UpdateResponse.NEW_DOCUMENT
+            )
+        except Exception:
+            # The vote row changed but its $inc did not; recount this document
+            await reconcile_counts(Vote, "vote_count", [document_id])
+            raise
+        if doc is None:
+            if action == "voted" and delta:
+                await Vote.find_one(Vote.document_id == document_id, Vote.user_id == user_id).delete()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        vote_count = doc.vote_count
+        if delta:
+            await publish_document_event(document_id, "vote", {"vote_count": vote_count})
         
         return {
             "action": action,
@@ -1207,13 +2114,10 @@ async def toggle_vote(
             detail=f"Error toggling vote: {str(e)}"
         )
 
-# Allow downloading files from the 'uploads' directory
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
 # --- Helper Functions for Quiz Generation ---
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file"""
+def extract_text_from_pdf(file_path: Union[str, bytes]) -> str:
+    """Extract text from a PDF file path or the PDF's bytes"""
     if not PDF_AVAILABLE:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1224,14 +2128,14 @@ def extract_text_from_pdf(file_path: str) -> str:
     try:
         if PDF_LIBRARY == "pdfplumber":
             import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
+            with pdfplumber.open(io.BytesIO(file_path) if isinstance(file_path, bytes) else file_path) as pdf:
                 for page in pdf.pages:
                     page_text = page.extract_text()
                     if page_text:
                         text += page_text + "\n"
         else:
             # Use PyPDF2
-            with open(file_path, 'rb') as file:
+            with (io.BytesIO(file_path) if isinstance(file_path, bytes) else open(file_path, 'rb')) as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page in pdf_reader.pages:
                     text += page.extract_text() + "\n"
@@ -1249,47 +2153,647 @@ def extract_text_from_pdf(file_path: str) -> str:
     
     return text
 
+# With INFERENCE_SERVER_ADDRESSES set, models live in inference_server.py processes shared by all workers
+inference_client = InferenceClient() if INFERENCE_SERVER_ADDRESSES else None
+
+model_load_locks = {"quiz": threading.Lock(), "summary": threading.Lock(), "keywords": threading.Lock()}
+
 def get_quiz_generator():
     """Get or initialize quiz generator"""
     global quiz_generator
-    if quiz_generator is None and AdvancedEnglishQuizGenerator:
-        try:
-            quiz_generator = AdvancedEnglishQuizGenerator()
-        except Exception as e:
-            print(f"Error initializing quiz generator: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Quiz generator initialization failed: {str(e)}"
-            )
+    if quiz_generator is not None:
+        return quiz_generator
+    # Warm-up, bank fills and requests can all ask at once; only one of them loads the model
+    with model_load_locks["quiz"]:
+        if quiz_generator is None and inference_client is not None:
+            quiz_generator = RemoteQuizGenerator(inference_client)
+        if quiz_generator is None and AdvancedEnglishQuizGenerator:
+            try:
+                quiz_generator = AdvancedEnglishQuizGenerator()
+            except Exception as e:
+                print(f"Error initializing quiz generator: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Quiz generator initialization failed: {str(e)}"
+                )
     return quiz_generator
 
 def get_summarizer():
     """Get or initialize summarizer"""
     global summarizer
-    if summarizer is None and ExtendedLectureSummarizer:
-        try:
-            summarizer = ExtendedLectureSummarizer()
-        except Exception as e:
-            print(f"Error initializing summarizer: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Summarizer initialization failed: {str(e)}"
-            )
+    if summarizer is not None:
+        return summarizer
+    with model_load_locks["summary"]:
+        if summarizer is None and inference_client is not None:
+            summarizer = RemoteSummarizer(inference_client)
+        if summarizer is None and ExtendedLectureSummarizer:
+            try:
+                summarizer = ExtendedLectureSummarizer()
+            except Exception as e:
+                print(f"Error initializing summarizer: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Summarizer initialization failed: {str(e)}"
+                )
     return summarizer
 
 def get_keyword_extractor():
     """Get or initialize keyword extractor"""
     global keyword_extractor
-    if keyword_extractor is None and KeywordExtractor:
+    if keyword_extractor is not None:
+        return keyword_extractor
+    with model_load_locks["keywords"]:
+        if keyword_extractor is None and inference_client is not None:
+            keyword_extractor = RemoteKeywordExtractor(inference_client)
+        if keyword_extractor is None and KeywordExtractor:
+            try:
+                keyword_extractor = KeywordExtractor()
+            except Exception as e:
+                print(f"Error initializing keyword extractor: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Keyword extractor initialization failed: {str(e)}"
+                )
+    return keyword_extractor
+
+# Blocking model work runs here so it does not stall the event loop
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+# Background jobs (upload text extraction, question bank fills) run outside the InferenceQueue, so
+# they get their own small pool and never hold the threads admitted requests were promised
+background_executor = ThreadPoolExecutor(max_workers=max(1, BACKGROUND_INFERENCE_THREADS), thread_name_prefix="background")
+
+# --- Model warm-up ---
+
+WARMUP_TEXT = (
+    "Data mining is the process of discovering patterns in large data sets. "
+    "Classification assigns items to predefined categories, while clustering groups similar items."
+)
+
+warmup_state = {"status": "disabled" if not WARMUP_MODELS else "pending", "models": {}, "error": None}
+
+def warm_up_model(name: str):
+    """Load one model and run a tiny inference so the first real request skips allocator/JIT warm-up"""
+    if inference_client is not None:
+        # Models live in the inference server; just check it answers
+        inference_client.call("ping")
+        return
+    getters = {"quiz": get_quiz_generator, "summary": get_summarizer, "keywords": get_keyword_extractor}
+    if name not in getters:
+        raise ValueError(f"Unknown model: {name}")
+    model = getters[name]()
+    if model is None:
+        # Its module failed to import; the model is missing, not warm
+        raise RuntimeError(f"{name} model is not available")
+    if name == "quiz":
+        next(iter(model.iter_quiz_questions(WARMUP_TEXT, 1)), None)
+    elif name == "summary":
+        model.expand_with_t5(WARMUP_TEXT)
+    else:
+        model.extract_from_text(WARMUP_TEXT, top_n=3)
+
+async def warm_up_models():
+    warmup_state["status"] = "running"
+    loop = asyncio.get_running_loop()
+    try:
+        for name in WARMUP_MODELS:
+            started = time.perf_counter()
+            await loop.run_in_executor(inference_executor, warm_up_model, name)
+            warmup_state["models"][name] = round((time.perf_counter() - started) * 1000, 1)
+        warmup_state["status"] = "ready"
+        print(f"Models warmed up: {warmup_state['models']}")
+    except Exception as e:
+        warmup_state["status"] = "failed"
+        warmup_state["error"] = str(getattr(e, "detail", e))
+        print(f"Error warming up models: {warmup_state['error']}")
+
+def format_question(q: dict, default_id: int) -> dict:
+    """Shape one generator question for the frontend: keep the answer label and add its text"""
+    # Convert correct_answer from label to text if needed
+    correct_answer = q.get("correct_answer", "")
+    options = q.get("options", {})
+    
+    # If correct_answer is a label (A, B, C, D), get the text
+    if correct_answer in options:
+        correct_answer_text = options[correct_answer]
+    else:
+        # Assume correct_answer is already text
+        correct_answer_text = correct_answer
+    
+    return {
+        "id": q.get("id", default_id),
+        "question": q.get("question", ""),
+        "options": options,
+        "correct_answer": correct_answer,  # Keep label for frontend
+        "correct_answer_text": correct_answer_text,  # Add text version
+        "explanation": q.get("explanation", "")
+    }
+
+def format_quiz(quiz_data: dict, quiz_title: str, source_document: str) -> dict:
+    """Shape generator output for the frontend"""
+    formatted_quiz = {
+        "quiz_title": quiz_data.get("quiz_title", quiz_title),
+        "source_document": source_document,
+        "total_questions": quiz_data.get("total_questions", 0),
+        "questions": []
+    }
+    
+    for q in quiz_data.get("questions", []):
+        formatted_quiz["questions"].append(format_question(q, len(formatted_quiz["questions"]) + 1))
+    
+    return formatted_quiz
+
+# --- Streaming helpers ---
+
+def sse_event(event: str, data) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+# --- Admission control ---
+
+rate_limiter = RateLimiter()
+inference_queue = InferenceQueue(workers=INFERENCE_THREADS)
+
+def consume_rate_limit(current_user: dict, endpoint: str):
+    """Take a token from the user's bucket for this endpoint group, or raise 429"""
+    retry_after = rate_limiter.acquire(str(current_user["_id"]), endpoint)
+    if retry_after:
+        metrics.incr("rate_limited_total")
+        metrics.incr(f"rate_limited_total.{endpoint}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many {endpoint} requests, retry in {math.ceil(retry_after)}s",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+def rate_limit(endpoint: str):
+    """Dependency returning the current user after taking a token from their bucket for this endpoint group"""
+    async def check_rate_limit(current_user: dict = Depends(get_current_user)):
+        consume_rate_limit(current_user, endpoint)
+        return current_user
+    return check_rate_limit
+
+def publish_admission_metrics():
+    metrics.set_gauge("inference_queue_pending", inference_queue.pending)
+    metrics.set_gauge("inference_queue_max", inference_queue.max_pending)
+    metrics.set_gauge("inference_estimated_wait_seconds", round(inference_queue.estimated_wait(), 1))
+    metrics.set_gauge("rate_limiter_buckets", len(rate_limiter))
+    for endpoint, (per_minute, burst) in RATE_LIMITS.items():
+        metrics.set_gauge(f"rate_limit_per_minute.{endpoint}", per_minute)
+        metrics.set_gauge(f"rate_limit_burst.{endpoint}", burst)
+
+def inference_busy() -> HTTPException:
+    """503 with Retry-After set to the estimated wait"""
+    wait = max(1, math.ceil(inference_queue.estimated_wait()))
+    metrics.incr("inference_rejected_total")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"AI service is busy, estimated wait {wait}s",
+        headers={"Retry-After": str(wait)}
+    )
+
+def check_inference_capacity():
+    """Refuse a request up front when the queue is full, before it buffers an upload. Streams take
+    their slot once the body starts."""
+    if not inference_queue.has_room():
+        raise inference_busy()
+
+def enter_inference_queue() -> float:
+    """Admit one inference request, or raise 503 with Retry-After set to the estimated wait"""
+    if not inference_queue.try_enter():
+        raise inference_busy()
+    metrics.incr("inference_admitted_total")
+    publish_admission_metrics()
+    return time.perf_counter()
+
+def leave_inference_queue(started: float, completed: bool = True):
+    # Only finished requests feed the service-time average; cancelled ones end early
+    inference_queue.leave(time.perf_counter() - started if completed else None)
+    publish_admission_metrics()
+
+@asynccontextmanager
+async def inference_slot():
+    started = enter_inference_queue()
+    completed = False
+    try:
+        yield
+        completed = True
+    finally:
+        leave_inference_queue(started, completed)
+
+async def inference_stream(events):
+    """Hold a queue slot for as long as an SSE stream runs. The slot is taken when the body
+    starts, inside this generator, so a client gone before then never holds one."""
+    try:
+        started = enter_inference_queue()
+    except HTTPException as e:
+        await events.aclose()
+        yield sse_event("error", {"stage": "queue", "detail": e.detail, "retry_after": e.headers["Retry-After"]})
+        return
+    completed = False
+    try:
+        async for event in events:
+            yield event
+        completed = True
+    finally:
+        await events.aclose()
+        leave_inference_queue(started, completed)
+
+async def stream_after_extract(source, stream_events, deadline_seconds: Optional[float], cleanup=None):
+    """Extract the PDF text inside the stream (and so inside its queue slot), then stream from it.
+    The deadline starts with the stream: extraction gets its share, stream_events(text, deadline)
+    the rest."""
+    try:
+        deadline = Deadline(deadline_seconds)
         try:
-            keyword_extractor = KeywordExtractor()
+            text = await asyncio.wait_for(
+                run_in_threadpool(extract_text_from_pdf, source), deadline.budget(STAGE_BUDGET_SHARES["extract"])
+            )
+        except asyncio.TimeoutError:
+            yield sse_event("timeout", {"stage": "extract", "partial": False})
+            yield sse_event("done", {"total_questions": 0, "stages": {"extract": STATUS_TIMEOUT}})
+            return
         except Exception as e:
-            print(f"Error initializing keyword extractor: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Keyword extractor initialization failed: {str(e)}"
+            yield sse_event("error", {"stage": "extract", "detail": f"Error extracting text from PDF: {e}"})
+            yield sse_event("done", {"total_questions": 0, "stages": {"extract": STATUS_ERROR}})
+            return
+        events = stream_events(text, deadline)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+    finally:
+        if cleanup:
+            cleanup()
+
+def abandon(token: CancellationToken):
+    """Cancel work whose client went away and count it"""
+    if not token.cancelled:
+        token.cancel(STATUS_DISCONNECTED)
+        metrics.incr("cancelled_requests_total")
+
+def record_cancelled_stages(run):
+    """Count the stages a disconnect stopped or kept from starting"""
+    cancelled = [name for name, stage_status in run.status.items() if stage_status == STATUS_DISCONNECTED]
+    if cancelled:
+        metrics.incr("cancelled_stages_total", len(cancelled))
+        metrics.incr("cancelled_stage_seconds_total", sum(run.timings_ms.get(name, 0) for name in cancelled) / 1000)
+
+@asynccontextmanager
+async def cancel_on_disconnect(raw_request: Request):
+    """Yield a token that is cancelled as soon as the client disconnects"""
+    token = CancellationToken()
+
+    async def watch():
+        while not token.cancelled:
+            if await raw_request.is_disconnected():
+                abandon(token)
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        yield token
+    finally:
+        watcher.cancel()
+
+def consume_future_exception(future):
+    """Done callback for work that was given up on, so its exception is not reported as unretrieved"""
+    if not future.cancelled():
+        future.exception()
+
+async def iterate_in_executor(make_iterator, cancel_token: Optional[CancellationToken] = None,
+                              timeout: Optional[float] = None):
+    """Run a blocking generator on the inference executor and yield its items as they arrive.
+    If the consumer stops early (the SSE client went away) the token is cancelled, so the
+    generator stops at its next check instead of running to completion. When timeout runs out
+    the token is cancelled as a timeout and iteration ends without waiting for the worker."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    finished = False
+
+    def produce():
+        try:
+            for item in make_iterator():
+                if cancel_token is not None and cancel_token.cancelled:
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    future = loop.run_in_executor(inference_executor, produce)
+    expires_at = loop.time() + timeout if timeout is not None else None
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    queue.get(), None if expires_at is None else max(0.0, expires_at - loop.time())
+                )
+            except asyncio.TimeoutError:
+                finished = True
+                if cancel_token is not None:
+                    cancel_token.cancel(STATUS_TIMEOUT)
+                future.add_done_callback(consume_future_exception)
+                return
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                finished = True
+                raise item
+            yield item
+        finished = True
+    finally:
+        if not finished and cancel_token is not None:
+            abandon(cancel_token)
+    await future
+
+async def run_inference(func, *args):
+    """Run one blocking model call on the inference executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, func, *args)
+
+async def run_stream_stage(name: str, func, token: CancellationToken, timeout: Optional[float]):
+    """Run func(stage_token) on the inference executor as one stage of an SSE pipeline, bounded
+    like a pipeline Stage: past its timeout the stage token is cancelled and the worker stops at
+    its next check. Returns (status, result)."""
+    if timeout is not None and timeout <= 0:
+        return STATUS_TIMEOUT, None
+    stage_token = CancellationToken(parent=token)
+    future = asyncio.ensure_future(run_inference(func, stage_token))
+    try:
+        return STATUS_OK, await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        stage_token.cancel(STATUS_TIMEOUT)
+        future.add_done_callback(consume_future_exception)
+        return STATUS_TIMEOUT, None
+    except StageCancelled:
+        return stage_token.cancel_reason() or STATUS_CANCELLED, None
+    except Exception as e:
+        print(f"Error in stage {name}: {e}")
+        return STATUS_ERROR, None
+
+async def stream_quiz_events(text: str, num_questions: int, bank: Optional["QuestionBank"] = None,
+                             cancel_token: Optional[CancellationToken] = None, timeout: Optional[float] = None):
+    """SSE 'question' events: sampled from the bank when possible, otherwise generated live.
+    Live generation stops after timeout seconds, cancelling cancel_token as a timeout."""
+    if question_bank_can_serve(bank, num_questions):
+        for q in sample_balanced(bank.questions, num_questions):
+            yield sse_event("question", format_question(q, q["id"]))
+        return
+    if timeout is not None and timeout <= 0:
+        if cancel_token is not None:
+            cancel_token.cancel(STATUS_TIMEOUT)
+        return
+    generator = await run_inference(get_quiz_generator)
+    if not generator:
+        raise RuntimeError("Quiz generator not available")
+    async for q in iterate_in_executor(
+        lambda: generator.iter_quiz_questions(
+            text, num_questions, first_batch=STREAM_FIRST_BATCH, cancel_token=cancel_token
+        ),
+        cancel_token, timeout
+    ):
+        yield sse_event("question", format_question(q, q["id"]))
+
+async def stream_pdf_events(text: str, deadline: Deadline, meta: dict, num_questions: int,
+                            include_summary: bool, include_keywords: bool, on_complete=None,
+                            reuse: Optional[dict] = None):
+    """SSE pipeline for process-pdf: meta, summary, keywords, each question, then done. Stages get
+    the same shares of the deadline as build_pdf_stages; one that runs out is cancelled and
+    followed by a 'timeout' event, and done reports every stage's status."""
+    reuse = reuse or {}
+    result = {"summary": None, "keywords": []}
+    stages = {}
+    total = 0
+    token = CancellationToken()
+    finished = False
+    try:
+        yield sse_event("meta", meta)
+        
+        # 1. Generate Summary
+        if include_summary and reuse.get("summary"):
+            result["summary"] = reuse["summary"]
+            stages["summary"] = STATUS_OK
+            yield sse_event("summary", {"summary": result["summary"]})
+        elif include_summary:
+            def summary_stage(stage_token):
+                summarizer_obj = get_summarizer()
+                return summarizer_obj.summarize_text(text, cancel_token=stage_token) if summarizer_obj else None
+            stages["summary"], result["summary"] = await run_stream_stage(
+                "summary", summary_stage, token, deadline.budget(STAGE_BUDGET_SHARES["summary"])
             )
-    return keyword_extractor
+            yield sse_event("summary", {"summary": result["summary"]})
+            if stages["summary"] == STATUS_TIMEOUT:
+                yield sse_event("timeout", {"stage": "summary", "partial": False})
+        
+        # 2. Extract Keywords (from summary if available, otherwise from original text)
+        if include_keywords and reuse.get("keywords"):
+            result["keywords"] = reuse["keywords"]
+            stages["keywords"] = STATUS_OK
+            yield sse_event("keywords", {"keywords": result["keywords"]})
+        elif include_keywords:
+            text_for_keywords = result["summary"] if result["summary"] else text
+            def keywords_stage(stage_token):
+                keyword_extractor_obj = get_keyword_extractor()
+                if not keyword_extractor_obj:
+                    return []
+                return keyword_extractor_obj.extract_from_text(text_for_keywords, top_n=10, cancel_token=stage_token)
+            stages["keywords"], keywords = await run_stream_stage(
+                "keywords", keywords_stage, token, deadline.budget(STAGE_BUDGET_SHARES["keywords"])
+            )
+            result["keywords"] = keywords or []
+            yield sse_event("keywords", {"keywords": result["keywords"]})
+            if stages["keywords"] == STATUS_TIMEOUT:
+                yield sse_event("timeout", {"stage": "keywords", "partial": False})
+        
+        # 3. Generate Quiz, one event per question
+        quiz_token = CancellationToken(parent=token)
+        try:
+            text_for_quiz = result["summary"] if result["summary"] else text
+            async for event in stream_quiz_events(text_for_quiz, num_questions, cancel_token=quiz_token,
+                                                  timeout=deadline.budget(STAGE_BUDGET_SHARES["quiz"])):
+                total += 1
+                yield event
+            stages["quiz"] = quiz_token.cancel_reason() or STATUS_OK
+        except Exception as e:
+            print(f"Error generating quiz: {e}")
+            stages["quiz"] = STATUS_ERROR
+            yield sse_event("error", {"stage": "quiz", "detail": str(e)})
+        if stages["quiz"] == STATUS_TIMEOUT:
+            yield sse_event("timeout", {"stage": "quiz", "partial": total > 0})
+        
+        yield sse_event("done", {"total_questions": total, "stages": stages})
+        finished = True
+    finally:
+        if not finished:
+            abandon(token)
+        if on_complete:
+            await on_complete(result)
+
+# --- Question Bank ---
+
+_question_bank_fills = set()  # file hashes currently being filled
+
+async def get_question_bank(file_hash: Optional[str], document_id: Optional[str] = None,
+                            duplicate_of: Optional[str] = None) -> Optional[QuestionBank]:
+    """Find the bank for a document, falling back to any bank built from the same file,
+    then to the bank of the document it near-duplicates"""
+    bank = None
+    if document_id:
+        bank = await QuestionBank.find_one(QuestionBank.document_id == document_id)
+    if bank is None and file_hash:
+        bank = await QuestionBank.find_one(QuestionBank.file_hash == file_hash)
+    if bank is None and duplicate_of:
+        bank = await QuestionBank.find_one(QuestionBank.document_id == duplicate_of)
+        if bank is not None:
+            metrics.incr("near_duplicate_question_bank_reuse_total")
+    return bank
+
+def question_bank_can_serve(bank: Optional[QuestionBank], num_questions: int) -> bool:
+    """A bank is usable if it holds enough questions, or was already filled for at least
+    this many and the generator simply could not produce more"""
+    if bank is None or not bank.questions:
+        return False
+    return len(bank.questions) >= num_questions or bank.target_size >= num_questions
+
+def question_bank_fill_useful(bank: Optional[QuestionBank], num_questions: int) -> bool:
+    """A background fill only pays off if a full-size bank could serve this request
+    and the existing bank was not already filled to that size"""
+    if num_questions > QUESTION_BANK_SIZE:
+        return False
+    return bank is None or bank.target_size < QUESTION_BANK_SIZE
+
+def sample_quiz_from_bank(bank: QuestionBank, num_questions: int, quiz_title: str, source_document: str) -> dict:
+    questions = sample_balanced(bank.questions, num_questions)
+    quiz = format_quiz(
+        {"quiz_title": quiz_title, "total_questions": len(questions), "questions": questions},
+        quiz_title, source_document
+    )
+    quiz["from_question_bank"] = True
+    return quiz
+
+async def fill_question_bank(file_hash: str, text: str, document_id: Optional[str] = None):
+    """Background task: generate a large set of questions once and store it for sampling"""
+    if file_hash in _question_bank_fills:
+        return
+    _question_bank_fills.add(file_hash)
+    try:
+        loop = asyncio.get_running_loop()
+        questions = await loop.run_in_executor(
+            background_executor, lambda: build_question_bank(get_quiz_generator(), text)
+        )
+        if not questions:
+            return
+        bank = await QuestionBank.find_one(QuestionBank.file_hash == file_hash)
+        if bank is None:
+            bank = QuestionBank(file_hash=file_hash)
+        bank.document_id = bank.document_id or document_id
+        bank.questions = questions
+        bank.target_size = QUESTION_BANK_SIZE
+        bank.updated_at = datetime.now()
+        await bank.save()
+        print(f"Question bank filled with {len(questions)} questions for {document_id or file_hash}")
+    except Exception as e:
+        print(f"Error filling question bank: {e}")
+    finally:
+        _question_bank_fills.discard(file_hash)
+
+async def prefill_question_bank(document_id: str, file_path: str, file_hash: str,
+                                text: Optional[str] = None, duplicate_of: Optional[str] = None):
+    """Background task run after upload so the first quiz request is served from the bank"""
+    try:
+        if await get_question_bank(file_hash, document_id, duplicate_of):
+            return
+        if text is None:
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(background_executor, extract_text_from_pdf, file_path)
+        await fill_question_bank(file_hash, text, document_id)
+    except Exception as e:
+        print(f"Error prefilling question bank for {document_id}: {e}")
+
+# --- Near-duplicate detection ---
+
+async def detect_near_duplicate(document_id: str, file_hash: Optional[str], text: str) -> Optional[str]:
+    """
+    Index a document's MinHash signature and link it to the most similar earlier upload.
+    A duplicate inherits the original's summary and keywords, and quiz requests fall back to
+    the original's question bank, so none of them are recomputed. Returns duplicate_of.
+    """
+    computed = await run_in_threadpool(text_signature, text)
+    if computed is None:
+        return None
+    signature, bands = computed
+
+    best, best_similarity = None, 0.0
+    async for candidate in TextSignature.find(In(TextSignature.bands, bands)):
+        if candidate.document_id == document_id:
+            continue
+        similarity = estimate_similarity(signature, candidate.signature)
+        if similarity > best_similarity:
+            best, best_similarity = candidate, similarity
+
+    duplicate_of = None
+    if best is not None and best_similarity >= NEAR_DUPLICATE_THRESHOLD:
+        # Link to the root of a chain of re-uploads rather than to the latest copy
+        duplicate_of = best.duplicate_of or best.document_id
+
+    await TextSignature.find_one(TextSignature.document_id == document_id).upsert(
+        Set({
+            TextSignature.file_hash: file_hash,
+            TextSignature.signature: signature,
+            TextSignature.bands: bands,
+            TextSignature.duplicate_of: duplicate_of,
+        }),
+        on_insert=TextSignature(document_id=document_id, file_hash=file_hash, signature=signature,
+                                bands=bands, duplicate_of=duplicate_of)
+    )
+    if duplicate_of is None:
+        return None
+
+    doc = await Document.get(PydanticObjectId(document_id))
+    if doc is None:
+        return None
+    original = await Document.get(PydanticObjectId(duplicate_of))
+    doc.duplicate_of = duplicate_of
+    doc.duplicate_similarity = round(best_similarity, 3)
+    if original is not None:
+        doc.summary = doc.summary or original.summary
+        doc.keywords = doc.keywords or original.keywords
+    await doc.save()
+    metrics.incr("near_duplicates_found_total")
+    print(f"Document {document_id} is a near-duplicate of {duplicate_of} ({best_similarity:.2f})")
+    return duplicate_of
+
+async def process_uploaded_pdf(document_id: str, file_path: str, file_hash: str):
+    """Background task after upload: extract the text once, check it for near-duplicates,
+    then prefill the question bank unless an original's bank can be reused"""
+    try:
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(background_executor, extract_text_from_pdf, file_path)
+    except Exception as e:
+        print(f"Error extracting text for {document_id}: {e}")
+        return
+    duplicate_of = None
+    if NEAR_DUPLICATE_ON_UPLOAD:
+        try:
+            duplicate_of = await detect_near_duplicate(document_id, file_hash, text)
+        except Exception as e:
+            print(f"Error checking {document_id} for near-duplicates: {e}")
+    if QUESTION_BANK_PREFILL_ON_UPLOAD:
+        await prefill_question_bank(document_id, file_path, file_hash, text=text, duplicate_of=duplicate_of)
+
+async def duplicate_results(doc: "Document") -> dict:
+    """Summary and keywords a near-duplicate can reuse from its original instead of recomputing"""
+    reuse = {"summary": doc.summary, "keywords": doc.keywords} if doc.duplicate_of else {}
+    if doc.duplicate_of and not (reuse["summary"] and reuse["keywords"]):
+        original = await Document.get(PydanticObjectId(doc.duplicate_of))
+        if original is not None:
+            reuse["summary"] = reuse["summary"] or original.summary
+            reuse["keywords"] = reuse["keywords"] or original.keywords
+    return {key: value for key, value in reuse.items() if value}
 
 # --- API for Quiz Generation ---
 
@@ -1302,11 +2806,126 @@ class ProcessPDFRequest(BaseModel):
     num_questions: int = Field(default=10, ge=1, le=50)
     include_summary: bool = Field(default=True)
     include_keywords: bool = Field(default=True)
+    include_quiz: bool = Field(default=True)
+    # "summary" waits for the summary stage (falling back to the raw text); "text" starts right away
+    keywords_source: Literal["summary", "text"] = Field(default="summary")
+    quiz_source: Literal["summary", "text"] = Field(default="summary")
+    deadline_seconds: Optional[float] = Field(default=None, gt=0, le=600)  # defaults to PROCESS_PDF_DEADLINE_SECONDS
+
+def quiz_stage_func(get_text, num_questions: int, quiz_title: str, source_document: str):
+    """Quiz stage that publishes the questions produced so far, so a timeout still returns them"""
+    def quiz_stage(results, token):
+        generator = get_quiz_generator()
+        if not generator:
+            return None
+        questions = []
+        for q in generator.iter_quiz_questions(
+            get_text(results), num_questions, first_batch=STREAM_FIRST_BATCH, cancel_token=token,
+            batch_size=QUIZ_STAGE_BATCH
+        ):
+            questions.append(q)
+            token.partial_result = format_quiz(
+                {"total_questions": len(questions), "questions": questions}, quiz_title, source_document
+            )
+        return format_quiz({"total_questions": len(questions), "questions": questions}, quiz_title, source_document)
+    return quiz_stage
+
+def build_pdf_stages(file_path: Union[str, bytes], options: ProcessPDFRequest, quiz_title: str, source_document: str, deadline: Deadline,
+                     reuse: Optional[dict] = None):
+    """Extraction, summary, keywords and quiz as a stage graph; keywords/quiz only depend on
+    the summary when they are configured to read it. Each stage gets its share of the deadline.
+    Results in `reuse` (a near-duplicate's original) are returned instead of recomputed."""
+    reuse = reuse or {}
+    def source_text(results, source):
+        return (results.get("summary") if source == "summary" else None) or results["extract"]
+
+    def extract_stage(results, token):
+        return extract_text_from_pdf(file_path)
+
+    def summary_stage(results, token):
+        if reuse.get("summary"):
+            return reuse["summary"]
+        summarizer_obj = get_summarizer()
+        # Summarises the extract stage's text instead of parsing the PDF a second time
+        return summarizer_obj.summarize_text(results["extract"], cancel_token=token) if summarizer_obj else None
+
+    def keywords_stage(results, token):
+        if reuse.get("keywords"):
+            return reuse["keywords"]
+        keyword_extractor_obj = get_keyword_extractor()
+        if not keyword_extractor_obj:
+            return []
+        return keyword_extractor_obj.extract_from_text(
+            source_text(results, options.keywords_source), top_n=10, cancel_token=token
+        )
+
+    def deps(source):
+        return ("extract", "summary") if source == "summary" and options.include_summary else ("extract",)
+
+    return [
+        Stage("extract", extract_stage, timeout=deadline.budget(STAGE_BUDGET_SHARES["extract"])),
+        Stage("summary", summary_stage, deps=("extract",), enabled=options.include_summary,
+              timeout=deadline.budget(STAGE_BUDGET_SHARES["summary"])),
+        Stage("keywords", keywords_stage, deps=deps(options.keywords_source), enabled=options.include_keywords,
+              timeout=deadline.budget(STAGE_BUDGET_SHARES["keywords"])),
+        Stage("quiz", quiz_stage_func(lambda results: source_text(results, options.quiz_source),
+                                      options.num_questions, quiz_title, source_document),
+              deps=deps(options.quiz_source), enabled=options.include_quiz,
+              timeout=deadline.budget(STAGE_BUDGET_SHARES["quiz"])),
+    ]
+
+def raise_for_stage(run, stage: str, detail: str):
+    """Turn a failed required stage into the matching HTTP error"""
+    if run.status.get(stage) == STATUS_OK:
+        return
+    error = run.exceptions.get(stage)
+    if isinstance(error, HTTPException):
+        raise error
+    if run.status.get(stage) == STATUS_TIMEOUT:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"{detail}: deadline exceeded"
+        )
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"{detail}: {run.errors.get(stage, run.status.get(stage))}"
+    )
+
+async def generate_quiz_with_deadline(text: str, num_questions: int, quiz_title: str, source_document: str,
+                                      cancel_token: Optional[CancellationToken] = None) -> dict:
+    """Live quiz generation bounded by QUIZ_DEADLINE_SECONDS; returns partial questions on timeout"""
+    async with inference_slot():
+        run = await run_stages(
+            [Stage("quiz", quiz_stage_func(lambda results: text, num_questions, quiz_title, source_document),
+                   timeout=QUIZ_DEADLINE_SECONDS)],
+            inference_executor, cancel_token=cancel_token
+        )
+    record_cancelled_stages(run)
+    quiz = run.results.get("quiz")
+    if quiz is None:
+        raise_for_stage(run, "quiz", "Error generating quiz")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Quiz generator not available"
+        )
+    quiz["stages"] = run.status
+    return quiz
+
+async def read_pdf_upload(file: UploadFile):
+    """Buffer a one-off PDF upload for processing; the caller discards it when done"""
+    try:
+        return await buffer_upload(file, BLOB_DIR)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        await file.close()
 
 @app.post("/api/generate-quiz-from-file")
 async def generate_quiz_from_file(
+    raw_request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    num_questions: int = Form(10),
+    num_questions: int = Form(10, ge=1, le=50),
     current_user: dict = Depends(get_current_user)
 ):
     """Generate quiz from uploaded PDF file"""
@@ -1319,63 +2938,35 @@ async def generate_quiz_from_file(
                     detail="Only PDF files are supported for quiz generation"
                 )
         
-        # Save temporary file
-        temp_file_path = os.path.join(UPLOAD_DIR, f"temp_{file.filename}")
-        try:
-            with open(temp_file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-        finally:
-            file.file.close()
+        # A question bank hit needs no slot, but a full queue is refused before the upload is buffered
+        check_inference_capacity()
         
-        # Extract text from PDF
-        text = extract_text_from_pdf(temp_file_path)
-        
-        # Clean up temp file
+        # Read into memory (hashed on the way); only large files spill to a unique temp file
+        pdf = await read_pdf_upload(file)
         try:
-            os.remove(temp_file_path)
-        except:
-            pass
+            file_hash = pdf.sha256
+            
+            # Serve from the question bank when this file was seen before
+            bank = await get_question_bank(file_hash)
+            if question_bank_can_serve(bank, num_questions):
+                return sample_quiz_from_bank(bank, num_questions, f"Quiz from {file.filename}", file.filename)
+            # Bank hits cost no inference, so only live generation takes a rate-limit token
+            consume_rate_limit(current_user, "generate-quiz")
+            
+            # Extract text from PDF
+            text = await run_in_threadpool(extract_text_from_pdf, pdf.source)
+        finally:
+            pdf.discard()
         
         # Generate quiz
-        generator = get_quiz_generator()
-        if not generator:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Quiz generator not available"
+        async with cancel_on_disconnect(raw_request) as token:
+            quiz = await generate_quiz_with_deadline(
+                text, num_questions, f"Quiz from {file.filename}", file.filename, cancel_token=token
             )
+        if question_bank_fill_useful(bank, num_questions):
+            background_tasks.add_task(fill_question_bank, file_hash, text)
         
-        quiz_data = generator.generate_complete_quiz(text, num_questions=num_questions)
-        
-        # Format quiz data to match expected format
-        formatted_quiz = {
-            "quiz_title": quiz_data.get("quiz_title", f"Quiz from {file.filename}"),
-            "source_document": file.filename,
-            "total_questions": quiz_data.get("total_questions", 0),
-            "questions": []
-        }
-        
-        for q in quiz_data.get("questions", []):
-            # Convert correct_answer from label to text if needed
-            correct_answer = q.get("correct_answer", "")
-            options = q.get("options", {})
-            
-            # If correct_answer is a label (A, B, C, D), get the text
-            if correct_answer in options:
-                correct_answer_text = options[correct_answer]
-            else:
-                # Assume correct_answer is already text
-                correct_answer_text = correct_answer
-            
-            formatted_quiz["questions"].append({
-                "id": q.get("id", len(formatted_quiz["questions"]) + 1),
-                "question": q.get("question", ""),
-                "options": options,
-                "correct_answer": correct_answer,  # Keep label for frontend
-                "correct_answer_text": correct_answer_text,  # Add text version
-                "explanation": q.get("explanation", "")
-            })
-        
-        return formatted_quiz
+        return quiz
         
     except HTTPException:
         raise
@@ -1389,6 +2980,8 @@ async def generate_quiz_from_file(
 async def generate_quiz_from_document(
     document_id: str,
     request: QuizGenerateRequest,
+    raw_request: Request,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """Generate quiz from existing document"""
@@ -1417,45 +3010,31 @@ async def generate_quiz_from_document(
                 detail="Document file not found"
             )
         
-        text = extract_text_from_pdf(file_path)
+        if not doc.file_hash:
+            doc.file_hash = await run_in_threadpool(compute_file_hash, file_path)
+            await doc.save()
         
-        # Generate quiz
-        generator = get_quiz_generator()
-        if not generator:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Quiz generator not available"
+        # Sample from the precomputed question bank when it is big enough
+        bank = await get_question_bank(doc.file_hash, document_id, doc.duplicate_of)
+        if question_bank_can_serve(bank, request.num_questions):
+            return sample_quiz_from_bank(
+                bank, request.num_questions,
+                f"Quiz from {doc.documentTitle}", doc.documentTitle or doc.filename
             )
+        consume_rate_limit(current_user, "generate-quiz")
         
-        quiz_data = generator.generate_complete_quiz(text, num_questions=request.num_questions)
-        
-        # Format quiz data
-        formatted_quiz = {
-            "quiz_title": quiz_data.get("quiz_title", f"Quiz from {doc.documentTitle}"),
-            "source_document": doc.documentTitle or doc.filename,
-            "total_questions": quiz_data.get("total_questions", 0),
-            "questions": []
-        }
+        text = await run_in_threadpool(extract_text_from_pdf, file_path)
         
-        for q in quiz_data.get("questions", []):
-            correct_answer = q.get("correct_answer", "")
-            options = q.get("options", {})
-            
-            if correct_answer in options:
-                correct_answer_text = options[correct_answer]
-            else:
-                correct_answer_text = correct_answer
-            
-            formatted_quiz["questions"].append({
-                "id": q.get("id", len(formatted_quiz["questions"]) + 1),
-                "question": q.get("question", ""),
-                "options": options,
-                "correct_answer": correct_answer,
-                "correct_answer_text": correct_answer_text,
-                "explanation": q.get("explanation", "")
-            })
+        # Generate quiz
+        async with cancel_on_disconnect(raw_request) as token:
+            quiz = await generate_quiz_with_deadline(
+                text, request.num_questions, f"Quiz from {doc.documentTitle}", doc.documentTitle or doc.filename,
+                cancel_token=token
+            )
+        if question_bank_fill_useful(bank, request.num_questions):
+            background_tasks.add_task(fill_question_bank, doc.file_hash, text, document_id)
         
-        return formatted_quiz
+        return quiz
         
     except HTTPException:
         raise
@@ -1469,7 +3048,8 @@ async def generate_quiz_from_document(
 async def process_pdf_document(
     document_id: str,
     request: ProcessPDFRequest,
-    current_user: dict = Depends(get_current_user)
+    raw_request: Request,
+    current_user: dict = Depends(rate_limit("process-pdf"))
 ):
     """
     Process PDF document: Extract text, summarize, extract keywords, and generate quiz
@@ -1499,79 +3079,29 @@ async def process_pdf_document(
                 detail="Document file not found"
             )
         
-        text = extract_text_from_pdf(file_path)
+        # Extraction, summary, keywords and quiz run as a stage graph on the inference executor,
+        # each bounded by its share of the request deadline
+        deadline = Deadline(request.deadline_seconds or PROCESS_PDF_DEADLINE_SECONDS)
+        reuse = await duplicate_results(doc)
+        async with inference_slot(), cancel_on_disconnect(raw_request) as token:
+            run = await run_stages(
+                build_pdf_stages(file_path, request, f"Quiz from {doc.documentTitle}", doc.documentTitle or doc.filename,
+                                 deadline, reuse=reuse),
+                inference_executor, deadline=deadline, cancel_token=token
+            )
+        record_cancelled_stages(run)
+        raise_for_stage(run, "extract", "Error extracting text from PDF")
         
         result = {
             "document_id": document_id,
             "document_title": doc.documentTitle or doc.filename,
-            "summary": None,
-            "keywords": [],
-            "quiz": None
+            "summary": run.results.get("summary"),
+            "keywords": run.results.get("keywords") or [],
+            "quiz": run.results.get("quiz"),
+            "stages": run.status,
+            "timings_ms": {**run.timings_ms, "total": run.total_ms}
         }
         
-        # 1. Generate Summary
-        if request.include_summary:
-            try:
-                summarizer_obj = get_summarizer()
-                if summarizer_obj:
-                    summary_text = summarizer_obj.get_summary_text(file_path)
-                    result["summary"] = summary_text
-            except Exception as e:
-                print(f"Error generating summary: {e}")
-                result["summary"] = None
-        
-        # 2. Extract Keywords (from summary if available, otherwise from original text)
-        if request.include_keywords:
-            try:
-                keyword_extractor_obj = get_keyword_extractor()
-                if keyword_extractor_obj:
-                    # Use summary if available, otherwise use original text
-                    text_for_keywords = result["summary"] if result["summary"] else text
-                    keywords = keyword_extractor_obj.extract_from_text(text_for_keywords, top_n=10)
-                    result["keywords"] = keywords
-            except Exception as e:
-                print(f"Error extracting keywords: {e}")
-                result["keywords"] = []
-        
-        # 3. Generate Quiz (use summary if available for better quality)
-        try:
-            generator = get_quiz_generator()
-            if generator:
-                # Use summary if available, otherwise use original text
-                text_for_quiz = result["summary"] if result["summary"] else text
-                quiz_data = generator.generate_complete_quiz(text_for_quiz, num_questions=request.num_questions)
-                
-                # Format quiz data
-                formatted_quiz = {
-                    "quiz_title": quiz_data.get("quiz_title", f"Quiz from {doc.documentTitle}"),
-                    "source_document": doc.documentTitle or doc.filename,
-                    "total_questions": quiz_data.get("total_questions", 0),
-                    "questions": []
-                }
-                
-                for q in quiz_data.get("questions", []):
-                    correct_answer = q.get("correct_answer", "")
-                    options = q.get("options", {})
-                    
-                    if correct_answer in options:
-                        correct_answer_text = options[correct_answer]
-                    else:
-                        correct_answer_text = correct_answer
-                    
-                    formatted_quiz["questions"].append({
-                        "id": q.get("id", len(formatted_quiz["questions"]) + 1),
-                        "question": q.get("question", ""),
-                        "options": options,
-                        "correct_answer": correct_answer,
-                        "correct_answer_text": correct_answer_text,
-                        "explanation": q.get("explanation", "")
-                    })
-                
-                result["quiz"] = formatted_quiz
-        except Exception as e:
-            print(f"Error generating quiz: {e}")
-            result["quiz"] = None
-        
         # Save summary and keywords to document in MongoDB
         try:
             if result["summary"]:
@@ -1597,11 +3127,15 @@ async def process_pdf_document(
 
 @app.post("/api/generate-quiz-from-file-complete")
 async def process_pdf_from_file(
+    raw_request: Request,
     file: UploadFile = File(...),
-    num_questions: int = Form(10),
+    num_questions: int = Form(10, ge=1, le=50),
     include_summary: bool = Form(True),
     include_keywords: bool = Form(True),
-    current_user: dict = Depends(get_current_user)
+    include_quiz: bool = Form(True),
+    keywords_source: Literal["summary", "text"] = Form("summary"),
+    quiz_source: Literal["summary", "text"] = Form("summary"),
+    current_user: dict = Depends(rate_limit("process-pdf"))
 ):
     """
     Process uploaded PDF file: Extract text, summarize, extract keywords, and generate quiz
@@ -1615,92 +3149,38 @@ async def process_pdf_from_file(
                     detail="Only PDF files are supported"
                 )
         
-        # Save temporary file
-        temp_file_path = os.path.join(UPLOAD_DIR, f"temp_{file.filename}")
-        try:
-            with open(temp_file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-        finally:
-            file.file.close()
+        options = ProcessPDFRequest(
+            num_questions=num_questions,
+            include_summary=include_summary,
+            include_keywords=include_keywords,
+            include_quiz=include_quiz,
+            keywords_source=keywords_source,
+            quiz_source=quiz_source
+        )
+        # Buffer inside the queue slot, so refused requests never read their upload into memory
+        async with inference_slot(), cancel_on_disconnect(raw_request) as token:
+            pdf = await read_pdf_upload(file)
+            try:
+                deadline = Deadline(PROCESS_PDF_DEADLINE_SECONDS)
+                run = await run_stages(
+                    build_pdf_stages(pdf.source, options, f"Quiz from {file.filename}", file.filename, deadline),
+                    inference_executor, deadline=deadline, cancel_token=token
+                )
+            finally:
+                pdf.discard()
+        record_cancelled_stages(run)
         
-        # Extract text from PDF
-        text = extract_text_from_pdf(temp_file_path)
+        raise_for_stage(run, "extract", "Error extracting text from PDF")
         
-        result = {
+        return {
             "document_title": file.filename,
-            "summary": None,
-            "keywords": [],
-            "quiz": None
+            "summary": run.results.get("summary"),
+            "keywords": run.results.get("keywords") or [],
+            "quiz": run.results.get("quiz"),
+            "stages": run.status,
+            "timings_ms": {**run.timings_ms, "total": run.total_ms}
         }
         
-        # 1. Generate Summary
-        if include_summary:
-            try:
-                summarizer_obj = get_summarizer()
-                if summarizer_obj:
-                    summary_text = summarizer_obj.get_summary_text(temp_file_path)
-                    result["summary"] = summary_text
-            except Exception as e:
-                print(f"Error generating summary: {e}")
-                result["summary"] = None
-        
-        # 2. Extract Keywords
-        if include_keywords:
-            try:
-                keyword_extractor_obj = get_keyword_extractor()
-                if keyword_extractor_obj:
-                    text_for_keywords = result["summary"] if result["summary"] else text
-                    keywords = keyword_extractor_obj.extract_from_text(text_for_keywords, top_n=10)
-                    result["keywords"] = keywords
-            except Exception as e:
-                print(f"Error extracting keywords: {e}")
-                result["keywords"] = []
-        
-        # 3. Generate Quiz
-        try:
-            generator = get_quiz_generator()
-            if generator:
-                text_for_quiz = result["summary"] if result["summary"] else text
-                quiz_data = generator.generate_complete_quiz(text_for_quiz, num_questions=num_questions)
-                
-                formatted_quiz = {
-                    "quiz_title": quiz_data.get("quiz_title", f"Quiz from {file.filename}"),
-                    "source_document": file.filename,
-                    "total_questions": quiz_data.get("total_questions", 0),
-                    "questions": []
-                }
-                
-                for q in quiz_data.get("questions", []):
-                    correct_answer = q.get("correct_answer", "")
-                    options = q.get("options", {})
-                    
-                    if correct_answer in options:
-                        correct_answer_text = options[correct_answer]
-                    else:
-                        correct_answer_text = correct_answer
-                    
-                    formatted_quiz["questions"].append({
-                        "id": q.get("id", len(formatted_quiz["questions"]) + 1),
-                        "question": q.get("question", ""),
-                        "options": options,
-                        "correct_answer": correct_answer,
-                        "correct_answer_text": correct_answer_text,
-                        "explanation": q.get("explanation", "")
-                    })
-                
-                result["quiz"] = formatted_quiz
-        except Exception as e:
-            print(f"Error generating quiz: {e}")
-            result["quiz"] = None
-        
-        # Clean up temp file
-        try:
-            os.remove(temp_file_path)
-        except:
-            pass
-        
-        return result
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -1709,6 +3189,171 @@ async def process_pdf_from_file(
             detail=f"Error processing PDF: {str(e)}"
         )
 
+# --- Streaming API for Quiz Generation (Server-Sent Events) ---
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+async def load_pdf_document(document_id: str) -> "Document":
+    """Fetch a PDF document whose file exists on disk, or raise the matching HTTP error"""
+    doc = await Document.get(PydanticObjectId(document_id))
+    if not doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    if not doc.content_type or "pdf" not in doc.content_type.lower():
+        if not doc.filename.lower().endswith('.pdf'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only PDF documents are supported"
+            )
+    if not os.path.exists(doc.saved_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document file not found"
+        )
+    return doc
+
+@app.post("/api/documents/{document_id}/generate-quiz/stream")
+async def stream_quiz_from_document(
+    document_id: str,
+    request: QuizGenerateRequest,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream quiz questions for an existing document as Server-Sent Events"""
+    doc = await load_pdf_document(document_id)
+    if not doc.file_hash:
+        doc.file_hash = await run_in_threadpool(compute_file_hash, doc.saved_path)
+        await doc.save()
+    
+    bank = await get_question_bank(doc.file_hash, document_id, doc.duplicate_of)
+    from_bank = question_bank_can_serve(bank, request.num_questions)
+    extracted = {}
+    if not from_bank:
+        # Bank hits cost no inference, so only live generation takes a rate-limit token
+        consume_rate_limit(current_user, "generate-quiz")
+        check_inference_capacity()
+        
+        async def fill_bank():
+            if extracted.get("text"):
+                await fill_question_bank(doc.file_hash, extracted["text"], document_id)
+        if question_bank_fill_useful(bank, request.num_questions):
+            background_tasks.add_task(fill_bank)
+    
+    async def events():
+        yield sse_event("meta", {
+            "document_id": document_id,
+            "quiz_title": f"Quiz from {doc.documentTitle}",
+            "source_document": doc.documentTitle or doc.filename
+        })
+        total = 0
+        token = CancellationToken()
+        stages = {}
+        # Bounded like generate_quiz_with_deadline; the clock starts with the stream (and its slot)
+        deadline = Deadline(None if from_bank else QUIZ_DEADLINE_SECONDS)
+        text = None
+        if not from_bank:
+            try:
+                text = extracted["text"] = await asyncio.wait_for(
+                    run_in_threadpool(extract_text_from_pdf, doc.saved_path),
+                    deadline.budget(STAGE_BUDGET_SHARES["extract"])
+                )
+                stages["extract"] = STATUS_OK
+            except asyncio.TimeoutError:
+                stages["extract"] = STATUS_TIMEOUT
+                yield sse_event("timeout", {"stage": "extract", "partial": False})
+            except Exception as e:
+                stages["extract"] = STATUS_ERROR
+                yield sse_event("error", {"stage": "extract", "detail": f"Error extracting text from PDF: {e}"})
+        if stages.get("extract", STATUS_OK) == STATUS_OK:
+            try:
+                async for event in stream_quiz_events(text, request.num_questions, bank, cancel_token=token,
+                                                      timeout=deadline.remaining()):
+                    total += 1
+                    yield event
+                stages["quiz"] = token.cancel_reason() or STATUS_OK
+            except Exception as e:
+                stages["quiz"] = STATUS_ERROR
+                yield sse_event("error", {"stage": "quiz", "detail": str(e)})
+        if stages.get("quiz") == STATUS_TIMEOUT:
+            yield sse_event("timeout", {"stage": "quiz", "partial": total > 0})
+        yield sse_event("done", {"total_questions": total, "stages": stages})
+    
+    stream = events() if from_bank else inference_stream(events())
+    return StreamingResponse(stream, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/api/documents/{document_id}/process-pdf/stream")
+async def stream_process_pdf_document(
+    document_id: str,
+    request: ProcessPDFRequest,
+    current_user: dict = Depends(rate_limit("process-pdf"))
+):
+    """Streaming process-pdf: summary, keywords and each question are sent as soon as they are ready"""
+    doc = await load_pdf_document(document_id)
+    reuse = await duplicate_results(doc)
+    check_inference_capacity()
+    
+    async def save_results(result):
+        # Save summary and keywords to document in MongoDB
+        try:
+            if result["summary"]:
+                doc.summary = result["summary"]
+            if result["keywords"]:
+                doc.keywords = result["keywords"]
+            if result["summary"] or result["keywords"]:
+                await doc.save()
+        except Exception as e:
+            print(f"Error saving summary/keywords to database: {e}")
+    
+    meta = {
+        "document_id": document_id,
+        "document_title": doc.documentTitle or doc.filename,
+        "quiz_title": f"Quiz from {doc.documentTitle}",
+        "source_document": doc.documentTitle or doc.filename
+    }
+    return StreamingResponse(
+        inference_stream(stream_after_extract(doc.saved_path, lambda text, deadline: stream_pdf_events(
+            text, deadline, meta, request.num_questions,
+            request.include_summary, request.include_keywords, on_complete=save_results, reuse=reuse
+        ), PROCESS_PDF_DEADLINE_SECONDS)),
+        media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+@app.post("/api/generate-quiz-from-file-complete/stream")
+async def stream_process_pdf_from_file(
+    file: UploadFile = File(...),
+    num_questions: int = Form(10, ge=1, le=50),
+    include_summary: bool = Form(True),
+    include_keywords: bool = Form(True),
+    current_user: dict = Depends(rate_limit("process-pdf"))
+):
+    """Streaming variant of generate-quiz-from-file-complete"""
+    if not file.content_type or "pdf" not in file.content_type.lower():
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only PDF files are supported"
+            )
+    
+    check_inference_capacity()
+    
+    # The text is extracted once, when the stream starts; every stage works from it. A stream
+    # that never starts leaves at most a spilled temp file, which the stale-temp sweep removes
+    pdf = await read_pdf_upload(file)
+    
+    meta = {
+        "document_title": file.filename,
+        "quiz_title": f"Quiz from {file.filename}",
+        "source_document": file.filename
+    }
+    return StreamingResponse(
+        inference_stream(stream_after_extract(pdf.source, lambda text, deadline: stream_pdf_events(
+            text, deadline, meta, num_questions, include_summary, include_keywords
+        ), PROCESS_PDF_DEADLINE_SECONDS, cleanup=pdf.discard)),
+        media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
 # Allow accessing avatar images - create directory if it doesn't exist
 AVATAR_DIR = "public/data/avatars"
 os.makedirs(AVATAR_DIR, exist_ok=True)
@@ -1718,6 +3363,9 @@ app.mount("/", StaticFiles(directory="public", html=True), name="public")
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["reconcile-counts"]:
+        asyncio.run(reconcile_all_counts())
+        sys.exit(0)
     print(f"Server is running at http://127.0.0.1:8000")
     print(f"Uploaded files will be saved in the directory: {os.path.abspath(UPLOAD_DIR)}")
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -0,0 +1,20 @@
+# gunicorn app:app -c gunicorn.conf.py
+# With PRELOAD_MODELS=true models load once in the master and are shared copy-on-write by the workers
+import os
+
+from preload import PRELOAD_MODELS, format_memory, memory_usage, preload_models
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = PRELOAD_MODELS
+
+
+def on_starting(server):
+    if PRELOAD_MODELS:
+        import app
+        preload_models(app)
+
+
+def post_worker_init(worker):
+    print(f"Worker {worker.pid} started: {format_memory(memory_usage())}")
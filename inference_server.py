@@ -0,0 +1,332 @@
+"""
+Model-holding inference process shared by several API workers.
+
+Run one or two of these next to uvicorn:
+
+    python inference_server.py /tmp/unihub-inference.sock
+
+and point the API at them with INFERENCE_SERVER_ADDRESSES (comma separated). Each server
+loads the quiz generator, summarizer and keyword extractor once; API workers connect over a
+local socket and stream results back. Payloads above SHM_THRESHOLD_BYTES (long PDF text,
+whole quizzes) travel through shared memory, so only a segment name crosses the socket.
+
+Messages are pickles, so whoever can connect can run code in the server. Unix sockets are
+created owner-only (0600); TCP addresses need a shared INFERENCE_SERVER_AUTHKEY on both ends.
+"""
+import os
+import sys
+import queue
+import pickle
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+from pipeline import CancellationToken, StageCancelled
+
+INFERENCE_SERVER_ADDRESSES = [a.strip() for a in os.getenv("INFERENCE_SERVER_ADDRESSES", "").split(",") if a.strip()]
+INFERENCE_SERVER_AUTHKEY = os.getenv("INFERENCE_SERVER_AUTHKEY", "").encode() or None
+INFERENCE_SERVER_JOBS = int(os.getenv("INFERENCE_SERVER_JOBS", "2"))
+SHM_THRESHOLD_BYTES = int(os.getenv("SHM_THRESHOLD_BYTES", str(64 * 1024)))
+POLL_SECONDS = 0.1
+
+
+def parse_address(address: str):
+    """'/path/to.sock' for a Unix socket, 'host:port' for TCP"""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return (host, int(port))
+    return address
+
+
+def check_authkey(address, authkey):
+    """Pickled messages must never be accepted from the network without authentication"""
+    if authkey is None and not isinstance(address, str):
+        raise ValueError(f"INFERENCE_SERVER_AUTHKEY must be set to use TCP address {address[0]}:{address[1]}")
+
+
+# --- Wire format ---
+
+def send_message(conn, message, segments: list = None):
+    """
+    Pickle a message; large ones go into a shared memory segment the receiver unlinks.
+    Segment names are appended to segments so the sender can unlink them itself if the
+    receiver goes away before reading them (see unlink_segments).
+    """
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) < SHM_THRESHOLD_BYTES:
+        conn.send_bytes(b"i" + data)
+        return
+    shm = SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[:len(data)] = data
+        # Ownership passes to the receiver, so this process must not clean it up at exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        if segments is not None:
+            segments.append(shm.name)
+        conn.send_bytes(b"s" + pickle.dumps((shm.name, len(data))))
+    except BaseException:
+        shm.unlink()
+        raise
+    finally:
+        shm.close()
+
+
+def unlink_segments(names):
+    """Remove segments handed to a receiver that disconnected; ones it already read are gone"""
+    for name in names:
+        try:
+            shm = SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
+
+
+def discard_pending(conn):
+    """Read and drop messages still queued on a connection, unlinking their segments"""
+    try:
+        while conn.poll(0):
+            receive_message(conn)
+    except (EOFError, OSError, FileNotFoundError):
+        pass
+
+
+def receive_message(conn):
+    raw = conn.recv_bytes()
+    if raw[:1] == b"i":
+        return pickle.loads(raw[1:])
+    name, size = pickle.loads(raw[1:])
+    shm = SharedMemory(name=name)
+    try:
+        with shm.buf[:size] as view:
+            return pickle.loads(view)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# --- Server ---
+
+class InferenceServer:
+    """Serves model calls to API workers; at most `jobs` run at once, each on its own thread."""
+
+    def __init__(self, address, authkey: bytes = INFERENCE_SERVER_AUTHKEY, jobs: int = INFERENCE_SERVER_JOBS):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        check_authkey(self.address, authkey)
+        self.authkey = authkey
+        self.slots = threading.Semaphore(jobs)
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+    def model(self, name: str):
+        """Load each model once per process, on first use"""
+        with self._models_lock:
+            if name not in self._models:
+                if name == "quiz":
+                    from make_quiz import AdvancedEnglishQuizGenerator
+                    self._models[name] = AdvancedEnglishQuizGenerator()
+                elif name == "summary":
+                    from summarizer import ExtendedLectureSummarizer
+                    self._models[name] = ExtendedLectureSummarizer()
+                elif name == "keywords":
+                    from keywords import KeywordExtractor
+                    self._models[name] = KeywordExtractor()
+                else:
+                    raise ValueError(f"Unknown model: {name}")
+            return self._models[name]
+
+    def run(self, op: str, args: dict, token: CancellationToken):
+        """Yield ('item', value) for streamed results and one ('result', value) at the end"""
+        if op == "quiz_questions":
+            for q in self.model("quiz").iter_quiz_questions(
+                args["text"], args["num_questions"], first_batch=args.get("first_batch"),
+                cancel_token=token, batch_size=args.get("batch_size")
+            ):
+                yield "item", q
+            yield "result", None
+        elif op == "quiz":
+            yield "result", self.model("quiz").generate_complete_quiz(
+                args["text"], num_questions=args["num_questions"], cancel_token=token
+            )
+        elif op == "summary":
+            yield "result", self.model("summary").get_summary_text(args["file_path"], cancel_token=token)
+        elif op == "summary_text":
+            yield "result", self.model("summary").summarize_text(args["text"], cancel_token=token)
+        elif op == "keywords":
+            yield "result", self.model("keywords").extract_from_text(
+                args["text"], top_n=args.get("top_n", 5), cancel_token=token
+            )
+        elif op == "ping":
+            yield "result", sorted(self._models)
+        else:
+            raise ValueError(f"Unknown operation: {op}")
+
+    def handle(self, conn):
+        token = CancellationToken()
+        out = queue.Queue()
+        try:
+            request = receive_message(conn)
+        except (EOFError, OSError):
+            conn.close()
+            return
+
+        def job():
+            try:
+                with self.slots:
+                    for message in self.run(request["op"], request.get("args", {}), token):
+                        out.put(message)
+            except StageCancelled as e:
+                out.put(("cancelled", str(e)))
+            except Exception as e:
+                print(f"Error in inference job {request.get('op')}: {e}")
+                out.put(("error", str(e)))
+            finally:
+                out.put(None)
+
+        threading.Thread(target=job, daemon=True).start()
+        segments = []
+        try:
+            while True:
+                # The only thing a client sends mid-request is a cancel (or it hangs up)
+                if not token.cancelled and conn.poll():
+                    try:
+                        token.cancel(receive_message(conn).get("cancel") or "cancelled")
+                    except EOFError:
+                        token.cancel("disconnected")
+                try:
+                    message = out.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if message is None:
+                    break
+                send_message(conn, message, segments)
+        except (EOFError, OSError):
+            token.cancel("disconnected")
+            unlink_segments(segments)
+        finally:
+            conn.close()
+
+    def listen(self) -> Listener:
+        if not isinstance(self.address, str):
+            return Listener(self.address, authkey=self.authkey)
+        # Create the socket owner-only from the start, not chmod it after other users could connect
+        umask = os.umask(0o177)
+        try:
+            return Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+
+    def serve_forever(self):
+        with self.listen() as listener:
+            print(f"Inference server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"Rejected inference connection: {e}")
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+
+# --- Client ---
+
+class InferenceClient:
+    """Blocking client used from the API's inference threads; one connection per call,
+    sent to whichever server has the fewest calls in flight from this process."""
+
+    def __init__(self, addresses=None, authkey: bytes = INFERENCE_SERVER_AUTHKEY):
+        self.addresses = [parse_address(a) for a in (addresses or INFERENCE_SERVER_ADDRESSES)]
+        if not self.addresses:
+            raise ValueError("No inference server addresses configured")
+        for address in self.addresses:
+            check_authkey(address, authkey)
+        self.authkey = authkey
+        self._in_flight = [0] * len(self.addresses)
+        self._lock = threading.Lock()
+
+    def stream(self, op: str, cancel_token=None, **args):
+        """Yield streamed items, then return the final result (available as StopIteration.value)"""
+        with self._lock:
+            index = min(range(len(self.addresses)), key=self._in_flight.__getitem__)
+            self._in_flight[index] += 1
+        try:
+            with Client(self.addresses[index], authkey=self.authkey) as conn:
+                segments = []
+                try:
+                    send_message(conn, {"op": op, "args": args}, segments)
+                    cancel_sent = False
+                    while True:
+                        if cancel_token is not None and cancel_token.cancelled and not cancel_sent:
+                            send_message(conn, {"cancel": cancel_token.cancel_reason()})
+                            cancel_sent = True
+                        if not conn.poll(POLL_SECONDS):
+                            continue
+                        kind, value = receive_message(conn)
+                        if kind == "item":
+                            yield value
+                        elif kind == "result":
+                            return value
+                        elif kind == "cancelled":
+                            raise StageCancelled(value)
+                        else:
+                            raise RuntimeError(f"Inference server error: {value}")
+                except (EOFError, OSError):
+                    unlink_segments(segments)
+                    raise
+                except BaseException:
+                    # Stopped early (error, cancel, caller gave up): free segments already sent to us
+                    discard_pending(conn)
+                    raise
+        finally:
+            with self._lock:
+                self._in_flight[index] -= 1
+
+    def call(self, op: str, cancel_token=None, **args):
+        stream = self.stream(op, cancel_token, **args)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as done:
+                return done.value
+
+
+class RemoteQuizGenerator:
+    """Same calls the API makes on AdvancedEnglishQuizGenerator, served by an inference server"""
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def iter_quiz_questions(self, english_text: str, num_questions: int = 15, first_batch: int = None,
+                            cancel_token=None, batch_size: int = None):
+        return self.client.stream("quiz_questions", cancel_token, text=english_text, num_questions=num_questions,
+                                  first_batch=first_batch, batch_size=batch_size)
+
+    def generate_complete_quiz(self, english_text: str, num_questions: int = 15, cancel_token=None):
+        return self.client.call("quiz", cancel_token, text=english_text, num_questions=num_questions)
+
+
+class RemoteSummarizer:
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def get_summary_text(self, file_path, cancel_token=None):
+        return self.client.call("summary", cancel_token, file_path=os.path.abspath(file_path))
+
+    def summarize_text(self, text, cancel_token=None):
+        return self.client.call("summary_text", cancel_token, text=text)
+
+
+class RemoteKeywordExtractor:
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    def extract_from_text(self, text: str, top_n=5, cancel_token=None, **kwargs):
+        return self.client.call("keywords", cancel_token, text=text, top_n=top_n)
+
+
+if __name__ == "__main__":
+    address = sys.argv[1] if len(sys.argv) > 1 else (INFERENCE_SERVER_ADDRESSES or ["/tmp/unihub-inference.sock"])[0]
+    if isinstance(parse_address(address), str) and os.path.exists(address):
+        os.remove(address)
+    InferenceServer(address).serve_forever()
@@ -1,5 +1,7 @@
 import os
 import re
+import random
+from collections import Counter
 
 VIETNAMESE_STOPWORDS = {
     'và', 'của', 'là', 'có', 'được', 'trong', 'với', 'cho', 'tại', 'để', 'về', 'các', 'một',
@@ -9,10 +11,20 @@ VIETNAMESE_STOPWORDS = {
     'cần', 'phải', 'muốn', 'có thể', 'để', 'làm', 'và', 'hoặc', 'nhưng', 'mà'
 }
 
+# Texts longer than this are processed chunk by chunk instead of as one KeyBERT document
+STREAMING_THRESHOLD_CHARS = 20000
+
 class KeywordExtractor:
-    def __init__(self, model_name='paraphrase-multilingual-MiniLM-L12-v2', stop_words=None):
+    def __init__(self, model_name='paraphrase-multilingual-MiniLM-L12-v2', stop_words=None,
+                 chunk_words=400, max_candidates=2000, max_tracked_candidates=50000, embed_batch_size=64,
+                 max_chunk_embeddings=256):
         self.model_name = model_name
         self.stop_words = stop_words or VIETNAMESE_STOPWORDS
+        self.chunk_words = chunk_words
+        self.max_candidates = max_candidates
+        self.max_tracked_candidates = max_tracked_candidates
+        self.embed_batch_size = embed_batch_size
+        self.max_chunk_embeddings = max_chunk_embeddings
         self._model = None
 
     def _init_model(self):
@@ -26,19 +38,24 @@ class KeywordExtractor:
             return ""
         return re.sub(r'\s+', ' ', text).strip()
 
-    def extract_from_text(self, text: str, top_n=5, ngram_range=(1,3), min_length=2):
+    def extract_from_text(self, text: str, top_n=5, ngram_range=(1,3), min_length=2, streaming=None, cancel_token=None):
         cleaned = self.clean_text(text)
         if not cleaned:
             return []
         self._init_model()
-        keywords_with_scores = self._model.extract_keywords(
-            cleaned,
-            keyphrase_ngram_range=ngram_range,
-            stop_words=list(self.stop_words),
-            top_n=top_n * 3,
-            use_mmr=True,
-            diversity=0.5
-        )
+        if streaming is None:
+            streaming = len(cleaned) > STREAMING_THRESHOLD_CHARS
+        if streaming:
+            keywords_with_scores = self._extract_streaming(cleaned, top_n * 3, ngram_range, min_length, cancel_token=cancel_token)
+        else:
+            keywords_with_scores = self._model.extract_keywords(
+                cleaned,
+                keyphrase_ngram_range=ngram_range,
+                stop_words=list(self.stop_words),
+                top_n=top_n * 3,
+                use_mmr=True,
+                diversity=0.5
+            )
         filtered, seen = [], set()
         for kw, score in keywords_with_scores:
             kw = kw.strip().lower()
@@ -49,6 +66,111 @@ class KeywordExtractor:
                 break
         return filtered
 
+    def iter_chunks(self, text: str):
+        words = text.split(' ')
+        for start in range(0, len(words), self.chunk_words):
+            yield ' '.join(words[start:start + self.chunk_words])
+
+    def _count_candidates(self, chunk: str, ngram_range, counts: Counter):
+        from sklearn.feature_extraction.text import CountVectorizer
+        try:
+            vectorizer = CountVectorizer(ngram_range=ngram_range, stop_words=list(self.stop_words))
+            matrix = vectorizer.fit_transform([chunk])
+        except ValueError:
+            # Chunk made only of stop words
+            return
+        for candidate, freq in zip(vectorizer.get_feature_names_out(), matrix.toarray()[0]):
+            counts[candidate] += int(freq)
+        if len(counts) > self.max_tracked_candidates:
+            # Keep the candidate table bounded: drop the rare tail, keep the frequent head
+            kept = counts.most_common(self.max_tracked_candidates // 2)
+            counts.clear()
+            counts.update(dict(kept))
+
+    def _embed(self, texts):
+        import numpy as np
+        batches = [
+            self._model.model.embed(texts[i:i + self.embed_batch_size])
+            for i in range(0, len(texts), self.embed_batch_size)
+        ]
+        embeddings = np.vstack(batches)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+
+    @staticmethod
+    def _mmr(candidate_embeddings, candidates, scores, top_n, diversity):
+        import numpy as np
+        candidate_sim = candidate_embeddings @ candidate_embeddings.T
+        selected = [int(np.argmax(scores))]
+        remaining = [i for i in range(len(candidates)) if i != selected[0]]
+        while remaining and len(selected) < top_n:
+            redundancy = candidate_sim[remaining][:, selected].max(axis=1)
+            mmr = (1 - diversity) * scores[remaining] - diversity * redundancy
+            best = remaining[int(np.argmax(mmr))]
+            selected.append(best)
+            remaining.remove(best)
+        return [(candidates[i], round(float(scores[i]), 4)) for i in selected]
+
+    def _extract_streaming(self, text: str, top_n, ngram_range, min_length, diversity=0.5, cancel_token=None):
+        """Chunked KeyBERT: count candidates per chunk, embed a pruned candidate set once,
+        then merge candidate scores against the chunks and the pooled document embedding.
+        Memory stays bounded whatever the length: the pooled embedding is a running weighted
+        sum, and chunks are compared through a uniform reservoir of max_chunk_embeddings."""
+        import numpy as np
+        counts = Counter()
+        pending, reservoir = [], []
+        pooled = {"sum": None, "weight": 0.0, "seen": 0}
+        rng = random.Random(0)
+
+        def flush_pending():
+            if not pending:
+                return
+            embeddings = self._embed(pending)
+            weights = np.asarray([len(chunk) for chunk in pending], dtype=np.float32)
+            weighted = (embeddings * weights[:, None]).sum(axis=0)
+            pooled["sum"] = weighted if pooled["sum"] is None else pooled["sum"] + weighted
+            pooled["weight"] += float(weights.sum())
+            for embedding in embeddings:
+                pooled["seen"] += 1
+                if len(reservoir) < self.max_chunk_embeddings:
+                    reservoir.append(embedding)
+                else:
+                    slot = rng.randrange(pooled["seen"])
+                    if slot < self.max_chunk_embeddings:
+                        reservoir[slot] = embedding
+            pending.clear()
+
+        for chunk in self.iter_chunks(text):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            self._count_candidates(chunk, ngram_range, counts)
+            pending.append(chunk)
+            if len(pending) >= self.embed_batch_size:
+                flush_pending()
+        flush_pending()
+        if not reservoir:
+            return []
+
+        candidates = [
+            kw for kw, _ in counts.most_common()
+            if len(kw) >= min_length and kw not in self.stop_words
+        ][:self.max_candidates]
+        if not candidates:
+            return []
+
+        chunk_matrix = np.vstack(reservoir)
+        doc_embedding = pooled["sum"] / pooled["weight"]
+        doc_embedding /= max(np.linalg.norm(doc_embedding), 1e-12)
+
+        candidate_embeddings = self._embed(candidates)
+        best_chunk_sim = np.full(len(candidates), -1.0, dtype=np.float32)
+        for start in range(0, len(chunk_matrix), self.embed_batch_size):
+            block = candidate_embeddings @ chunk_matrix[start:start + self.embed_batch_size].T
+            best_chunk_sim = np.maximum(best_chunk_sim, block.max(axis=1))
+        scores = 0.5 * (candidate_embeddings @ doc_embedding) + 0.5 * best_chunk_sim
+
+        return self._mmr(candidate_embeddings, candidates, scores, top_n, diversity)
+
     def extract_from_summary_file(self, original_filename: str, top_n=5, ngram_range=(1,3), min_length=2):
         base = os.path.splitext(os.path.basename(original_filename))[0]
         path = f"summaries/{base}_summary_EN.txt"
@@ -1,14 +1,22 @@
 import re
 import random
 import json
-import numpy as np
-from typing import List, Dict, Any
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
-import torch
-from sentence_transformers import SentenceTransformer, util
+from typing import List, Dict, Any, Optional
+from text_chunker import TokenChunker
+from pipeline import stopping_criteria
+
+QG_PREFIX = "generate question: "
+QUIZ_TITLE = "Advanced Data Mining Concepts Quiz"
+# Generate 2-3 different questions per concept
+QUESTIONS_PER_CONCEPT = 3
 
 class AdvancedEnglishQuizGenerator:
     def __init__(self):
+        # Heavy libraries are imported here so importing this module stays cheap
+        import torch
+        from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+        from sentence_transformers import SentenceTransformer
+
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         print(f"🚀 Using device: {self.device}")
         
@@ -19,6 +27,9 @@ class AdvancedEnglishQuizGenerator:
         # Better question generation model
         self.qg_tokenizer = AutoTokenizer.from_pretrained("mrm8488/t5-base-finetuned-question-generation-ap")
         self.qg_model = AutoModelForSeq2SeqLM.from_pretrained("mrm8488/t5-base-finetuned-question-generation-ap").to(self.device)
+        self.qg_chunker = TokenChunker(self.qg_tokenizer, max_tokens=512)
+        self.qg_batch_size = 16
+        self.qa_batch_size = 16
         
         self.qa_pipeline = pipeline(
             "question-answering",
@@ -157,16 +168,21 @@ class AdvancedEnglishQuizGenerator:
 
     def generate_diverse_question(self, concept_data: Dict[str, Any]) -> Dict[str, str]:
         """Generate diverse questions using multiple strategies"""
+        model_question = self._generate_from_model_batch([concept_data["context"]], [concept_data["concept"]])[0]
+        question_data = self._pick_question(concept_data, model_question)
+        if not question_data:
+            return None
+        question_data["correct_answer"] = self._extract_precise_answers_batch([question_data])[0]
+        return question_data
+
+    def _pick_question(self, concept_data: Dict[str, Any], model_question: str) -> Dict[str, str]:
+        """Choose one of the template, model and key-points questions for a concept"""
         concept = concept_data["concept"]
-        context = concept_data["context"]
         question_type = concept_data["type"]
         
         # Strategy 1: Use template-based generation
         template_question = self._generate_from_template(concept, question_type)
         
-        # Strategy 2: Use model-based generation
-        model_question = self._generate_from_model(context, concept)
-        
         # Strategy 3: Use key-points based generation
         keypoints_question = self._generate_from_keypoints(concept_data["key_points"], concept)
         
@@ -176,16 +192,12 @@ class AdvancedEnglishQuizGenerator:
         
         if not valid_questions:
             return None
-            
-        selected_question = random.choice(valid_questions)
-        
-        # Get answer
-        answer = self._extract_precise_answer(selected_question, context, concept_data["key_points"])
         
         return {
-            "question": selected_question,
-            "correct_answer": answer,
-            "context": context,
+            "question": random.choice(valid_questions),
+            "correct_answer": None,
+            "context": concept_data["context"],
+            "key_points": concept_data["key_points"],
             "concept": concept,
             "type": question_type
         }
@@ -197,37 +209,56 @@ class AdvancedEnglishQuizGenerator:
             return template.format(concept=concept, process=concept)
         return None
 
+    def _encode_qg_input(self, context: str) -> Optional[List[int]]:
+        """
+        Token ids for the first 512-token window of the context, prefix and EOS included.
+        One question is asked per concept, so a longer context is truncated to that window.
+        """
+        chunks = self.qg_chunker.chunk(context, prefix=QG_PREFIX, max_chunks=1)
+        return self.qg_chunker.build_input_ids(chunks[0], prefix=QG_PREFIX) if chunks else None
+
     def _generate_from_model(self, context: str, concept: str) -> str:
         """Generate question using AI model"""
+        return self._generate_from_model_batch([context], [concept])[0]
+
+    def _generate_from_model_batch(self, contexts: List[str], concepts: List[str], cancel_token=None) -> List[str]:
+        """Generate one question per context with padded, batched generate calls"""
+        questions = [None] * len(contexts)
         try:
-            input_text = f"generate question: {context}"
+            encoded = []
+            for i, context in enumerate(contexts):
+                input_ids = self._encode_qg_input(context)
+                if input_ids:
+                    encoded.append((i, input_ids))
             
-            inputs = self.qg_tokenizer(
-                input_text, 
-                return_tensors="pt", 
-                max_length=512, 
-                truncation=True
-            ).to(self.device)
-            
-            outputs = self.qg_model.generate(
-                inputs.input_ids,
-                max_length=64,
-                num_beams=4,
-                early_stopping=True,
-                temperature=0.8
-            )
-            
-            question = self.qg_tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            # Ensure question is about the concept
-            if concept.lower() not in question.lower():
-                question = f"What is {concept} in data mining?"
+            for start in range(0, len(encoded), self.qg_batch_size):
+                if cancel_token is not None and cancel_token.cancelled:
+                    break
+                batch = encoded[start:start + self.qg_batch_size]
+                inputs = self.qg_tokenizer.pad(
+                    {"input_ids": [ids for _, ids in batch]},
+                    return_tensors="pt"
+                ).to(self.device)
+                
+                outputs = self.qg_model.generate(
+                    inputs.input_ids,
+                    attention_mask=inputs.attention_mask,
+                    max_length=64,
+                    num_beams=4,
+                    early_stopping=True,
+                    stopping_criteria=stopping_criteria(cancel_token)
+                )
+                decoded = self.qg_tokenizer.batch_decode(outputs, skip_special_tokens=True)
                 
-            return question
+                for (i, _), question in zip(batch, decoded):
+                    # Ensure question is about the concept
+                    if concepts[i].lower() not in question.lower():
+                        question = f"What is {concepts[i]} in data mining?"
+                    questions[i] = question
             
         except Exception as e:
             print(f"Model generation error: {e}")
-            return None
+        return questions
 
     def _generate_from_keypoints(self, key_points: List[str], concept: str) -> str:
         """Generate question from key points"""
@@ -242,17 +273,34 @@ class AdvancedEnglishQuizGenerator:
 
     def _extract_precise_answer(self, question: str, context: str, key_points: List[str]) -> str:
         """Extract precise answer using multiple strategies"""
+        return self._extract_precise_answers_batch([
+            {"question": question, "context": context, "key_points": key_points}
+        ])[0]
+
+    def _extract_precise_answers_batch(self, items: List[Dict[str, Any]]) -> List[str]:
+        """Answer all questions with one batched QA pipeline call, falling back per question"""
+        model_answers = [None] * len(items)
         try:
             # Strategy 1: Use QA model
-            qa_result = self.qa_pipeline(question=question, context=context)
-            model_answer = qa_result['answer'].strip()
-            
-            if len(model_answer) > 10:
-                return model_answer
-                
-        except:
-            pass
+            qa_results = self.qa_pipeline(
+                question=[item["question"] for item in items],
+                context=[item["context"] for item in items],
+                batch_size=self.qa_batch_size
+            )
+            if isinstance(qa_results, dict):
+                qa_results = [qa_results]
+            model_answers = [r['answer'].strip() for r in qa_results]
+        except Exception as e:
+            print(f"QA pipeline error: {e}")
         
+        return [
+            answer if answer and len(answer) > 10
+            else self._fallback_answer(item["question"], item["context"], item["key_points"])
+            for item, answer in zip(items, model_answers)
+        ]
+
+    def _fallback_answer(self, question: str, context: str, key_points: List[str]) -> str:
+        """Answer without the QA model using key points and context patterns"""
         # Strategy 2: Use key points matching
         question_lower = question.lower()
         for point in key_points:
@@ -385,68 +433,125 @@ class AdvancedEnglishQuizGenerator:
         
         return random.sample(distractors, 3)
 
-    def generate_complete_quiz(self, english_text: str, num_questions: int = 15) -> Dict[str, Any]:
-        """Generate complete improved quiz"""
+    def plan_questions(self, concepts_data: List[Dict[str, Any]], num_questions: int, cancel_token=None) -> List[Dict[str, Any]]:
+        """Pick up to 3 questions per concept; one batched generate covers the concepts that got a slot"""
+        slots = []
+        slot_concepts = []
+        for concept_data in concepts_data:
+            if len(slots) >= num_questions:
+                break
+            slot_concepts.append(concept_data)
+            slots.extend([concept_data] * min(QUESTIONS_PER_CONCEPT, num_questions - len(slots)))
+        
+        model_questions = self._generate_from_model_batch(
+            [c["context"] for c in slot_concepts],
+            [c["concept"] for c in slot_concepts],
+            cancel_token
+        ) if slot_concepts else []
+        model_by_concept = {c["concept"]: q for c, q in zip(slot_concepts, model_questions)}
+        
+        planned = []
+        for concept_data in slots:
+            question_data = self._pick_question(concept_data, model_by_concept.get(concept_data["concept"]))
+            if question_data:
+                planned.append(question_data)
+        return planned
+
+    def assemble_question(self, question_data: Dict[str, Any], question_id: int) -> Dict[str, Any]:
+        """Turn an answered question into a multiple-choice entry, or None if unusable"""
+        # Generate distractors
+        distractors = self.generate_quality_distractors(
+            question_data["correct_answer"],
+            question_data["concept"], 
+            question_data["type"]
+        )
+        
+        # Create options
+        all_options = [question_data["correct_answer"]] + distractors
+        random.shuffle(all_options)
+        
+        options_dict = {}
+        correct_label = ""
+        
+        for j, option in enumerate(all_options):
+            label = chr(65 + j)
+            options_dict[label] = option
+            if option == question_data["correct_answer"]:
+                correct_label = label
+        
+        if not correct_label:
+            return None
+        return {
+            "id": question_id,
+            "question": question_data["question"],
+            "options": options_dict,
+            "correct_answer": correct_label,
+            "explanation": f"Based on: {question_data['context'][:100]}...",
+            "concept": question_data["concept"],
+            "type": question_data["type"]
+        }
+
+    def iter_quiz_questions(self, english_text: str, num_questions: int = 15, first_batch: int = None,
+                            cancel_token=None, batch_size: int = None):
+        """
+        Yield quiz questions as they are produced. Each round takes just enough of the next
+        concepts to fill the remaining questions; duplicate or unusable questions are made up
+        in a further round until num_questions are produced or the concepts run out. With
+        first_batch set, the first round is limited to that many concepts so the first
+        question arrives after one small batch; batch_size caps every later round the same
+        way, so questions keep arriving (and survive a timeout) every few concepts.
+        A cancelled cancel_token stops generation between and inside model calls.
+        """
         print("🔨 Processing text with advanced extraction...")
         
         concepts_data = self.extract_key_concepts_with_context(english_text)
         print(f"📚 Found {len(concepts_data)} concept groups")
         
-        quiz_questions = []
+        produced = 0
+        position = 0
+        batch_limit = first_batch
         used_combinations = set()
-        
-        # Generate multiple questions per concept
-        for concept_data in concepts_data:
-            if len(quiz_questions) >= num_questions:
-                break
-                
-            # Generate 2-3 different questions per concept
-            for i in range(min(3, num_questions - len(quiz_questions))):
-                question_data = self.generate_diverse_question(concept_data)
-                
-                if not question_data:
-                    continue
-                    
+        while produced < num_questions and position < len(concepts_data):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            
+            remaining = num_questions - produced
+            take = -(-remaining // QUESTIONS_PER_CONCEPT)
+            if batch_limit:
+                take = min(take, batch_limit)
+                batch_limit = None
+            elif batch_size:
+                take = min(take, batch_size)
+            concept_batch = concepts_data[position:position + take]
+            position += take
+            
+            # Batched pipeline: one generate pass for the batch's concepts, then one QA pass
+            planned = []
+            for question_data in self.plan_questions(concept_batch, remaining, cancel_token):
                 # Check for uniqueness
-                question_hash = hash(question_data["question"][:50] + concept_data["concept"])
+                question_hash = hash(question_data["question"][:50] + question_data["concept"])
                 if question_hash in used_combinations:
                     continue
-                    
                 used_combinations.add(question_hash)
-                
-                # Generate distractors
-                distractors = self.generate_quality_distractors(
-                    question_data["correct_answer"],
-                    concept_data["concept"], 
-                    concept_data["type"]
-                )
-                
-                # Create options
-                all_options = [question_data["correct_answer"]] + distractors
-                random.shuffle(all_options)
-                
-                options_dict = {}
-                correct_label = ""
-                
-                for j, option in enumerate(all_options):
-                    label = chr(65 + j)
-                    options_dict[label] = option
-                    if option == question_data["correct_answer"]:
-                        correct_label = label
-                
-                if correct_label:
-                    quiz_questions.append({
-                        "id": len(quiz_questions) + 1,
-                        "question": question_data["question"],
-                        "options": options_dict,
-                        "correct_answer": correct_label,
-                        "explanation": f"Based on: {question_data['context'][:100]}...",
-                        "concept": question_data["concept"],
-                        "type": question_data["type"]
-                    })
+                planned.append(question_data)
+            
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            answers = self._extract_precise_answers_batch(planned) if planned else []
+            
+            for question_data, answer in zip(planned, answers):
+                question_data["correct_answer"] = answer
+                question = self.assemble_question(question_data, produced + 1)
+                if question:
+                    produced += 1
+                    yield question
+
+    def generate_complete_quiz(self, english_text: str, num_questions: int = 15, cancel_token=None) -> Dict[str, Any]:
+        """Generate complete improved quiz"""
+        quiz_questions = list(self.iter_quiz_questions(english_text, num_questions, cancel_token=cancel_token))
         
         return {
-            "quiz_title": "Advanced Data Mining Concepts Quiz",
+            "quiz_title": QUIZ_TITLE,
             "total_questions": len(quiz_questions),
             "questions": quiz_questions,
             "concepts_covered": list(set([q["concept"] for q in quiz_questions]))
@@ -0,0 +1,27 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """Process-local counters and gauges, safe to update from inference threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {k: (int(v) if float(v).is_integer() else round(v, 3)) for k, v in self._counters.items()}
+            return {"counters": counters, "gauges": dict(self._gauges)}
+
+
+metrics = Metrics()
@@ -0,0 +1,98 @@
+"""
+Near-duplicate detection for uploaded documents.
+
+Each document's extracted text becomes a set of word shingles, summarised by a MinHash
+signature: the fraction of equal positions in two signatures estimates the Jaccard similarity
+of the shingle sets. The signature is cut into bands; documents sharing any band key are
+candidates (LSH), so a lookup touches a handful of documents instead of all of them.
+With 32 bands of 4 rows a pair at similarity 0.8 becomes a candidate with probability ~1.0,
+one at 0.3 with ~0.23.
+"""
+import os
+import re
+import zlib
+import hashlib
+from typing import List, Sequence
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# Documents with fewer shingles than this (scanned slides, title pages) are not compared
+MIN_SHINGLES = 20
+
+_PRIME = (1 << 31) - 1
+_MAX_HASH = (1 << 32) - 1
+_BLOCK = 8192
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _permutations(num_perm: int):
+    """Fixed (a, b) pairs for h(x) = (a*x + b) mod p; seeded so signatures stay comparable across processes"""
+    params = []
+    counter = 0
+    while len(params) < num_perm:
+        digest = hashlib.sha256(f"minhash-{counter}".encode()).digest()
+        a = int.from_bytes(digest[:4], "big") % _PRIME
+        b = int.from_bytes(digest[4:8], "big") % _PRIME
+        counter += 1
+        if a:
+            params.append((a, b))
+    return params
+
+
+_PARAMS = _permutations(NUM_PERM)
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    """32-bit hashes of overlapping word n-grams; case and punctuation are ignored"""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(shingle_hashes) -> List[int]:
+    """Minimum of each permutation over the shingle hashes, vectorised in blocks"""
+    import numpy as np
+
+    values = np.fromiter(shingle_hashes, dtype=np.uint64)
+    if not len(values):
+        return []
+    a = np.array([p[0] for p in _PARAMS], dtype=np.uint64)[:, None]
+    b = np.array([p[1] for p in _PARAMS], dtype=np.uint64)[:, None]
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(values), _BLOCK):
+        block = values[start:start + _BLOCK][None, :]
+        # a < 2^31 and x < 2^32, so a*x + b cannot overflow 64 bits
+        hashed = (a * block + b) % _PRIME
+        signature = np.minimum(signature, hashed.min(axis=1))
+    return [int(v) for v in signature]
+
+
+def band_keys(signature: Sequence[int], bands: int = LSH_BANDS) -> List[str]:
+    """One key per band; two signatures sharing a key are LSH candidates"""
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        chunk = ",".join(str(v) for v in signature[band * rows:(band + 1) * rows])
+        keys.append(f"{band}:{hashlib.blake2b(chunk.encode(), digest_size=8).hexdigest()}")
+    return keys
+
+
+def estimate_similarity(first: Sequence[int], second: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def text_signature(text: str):
+    """(signature, band keys) for a document, or None when there is too little text to compare"""
+    hashes = shingles(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    signature = minhash_signature(hashes)
+    return signature, band_keys(signature)
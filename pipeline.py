@@ -0,0 +1,207 @@
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_SKIPPED = "skipped"
+STATUS_TIMEOUT = "timeout"
+STATUS_CANCELLED = "cancelled"
+
+
+class StageCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    """
+    Thread-safe flag checked cooperatively by model code. A token with a parent is also
+    cancelled when the parent is, so one request-level token can stop every stage.
+    Long-running code may publish what it has so far in partial_result.
+    """
+
+    def __init__(self, parent: Optional["CancellationToken"] = None):
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self.partial_result: Any = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = STATUS_CANCELLED):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def cancel_reason(self) -> Optional[str]:
+        if self._event.is_set():
+            return self.reason
+        return self.parent.cancel_reason() if self.parent is not None else None
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise StageCancelled(self.cancel_reason())
+
+
+def stopping_criteria(token: Optional[CancellationToken]):
+    """StoppingCriteriaList that ends generate() once the token is cancelled (None without a token)"""
+    if token is None:
+        return None
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class CancelledCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return token.cancelled
+
+    return StoppingCriteriaList([CancelledCriteria()])
+
+
+class Deadline:
+    """Overall time budget for a request; stages get a share of it, capped by what is left."""
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, share: float) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return min(self.seconds * share, self.remaining())
+
+
+class Stage:
+    """
+    One step of a processing pipeline. func(results, token) receives the results of finished
+    stages (name -> value) and a CancellationToken, and runs on the given executor; deps lists
+    the stages it must wait for and timeout (seconds) is its deadline once started.
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any], CancellationToken], Any],
+                 deps: Iterable[str] = (), enabled: bool = True, timeout: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.enabled = enabled
+        self.timeout = timeout
+
+
+class PipelineRun:
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        self.status: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+        self.exceptions: Dict[str, BaseException] = {}
+        self.timings_ms: Dict[str, float] = {}
+        self.total_ms: float = 0.0
+
+
+async def run_stages(stages: Iterable[Stage], executor=None, deadline: Optional[Deadline] = None,
+                     cancel_token: Optional[CancellationToken] = None) -> PipelineRun:
+    """Run stages as a dependency graph: each starts as soon as its deps are done, so
+    end-to-end latency is the critical path rather than the sum of all stages.
+
+    A stage that outlives its timeout (or the overall deadline) is cancelled through its
+    token and reported as 'timeout' with whatever partial result it published; the other
+    stages carry on, so the caller always gets back everything that finished."""
+    stages = {stage.name: stage for stage in stages}
+    for stage in stages.values():
+        missing = [dep for dep in stage.deps if dep not in stages]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    loop = asyncio.get_running_loop()
+    run = PipelineRun()
+    tasks: Dict[str, asyncio.Task] = {}
+    started = time.perf_counter()
+
+    async def execute(stage: Stage):
+        if stage.deps:
+            await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        if not stage.enabled:
+            run.status[stage.name] = STATUS_SKIPPED
+            run.results[stage.name] = None
+            return
+        if cancel_token is not None and cancel_token.cancelled:
+            run.status[stage.name] = cancel_token.cancel_reason() or STATUS_CANCELLED
+            run.results[stage.name] = None
+            return
+        timeout = stage.timeout
+        remaining = deadline.remaining() if deadline else None
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        if timeout is not None and timeout <= 0:
+            run.status[stage.name] = STATUS_TIMEOUT
+            run.results[stage.name] = None
+            return
+
+        token = CancellationToken(parent=cancel_token)
+        stage_started = None
+
+        def call(results):
+            # Timed inside the worker so executor queueing is not counted as stage time
+            nonlocal stage_started
+            stage_started = time.perf_counter()
+            token.raise_if_cancelled()
+            return stage.func(results, token)
+
+        future = loop.run_in_executor(executor, call, dict(run.results))
+        try:
+            run.results[stage.name] = await asyncio.wait_for(asyncio.shield(future), timeout)
+            run.status[stage.name] = STATUS_OK
+        except asyncio.TimeoutError:
+            # Cooperative: the worker stops at its next token check; we do not wait for it
+            token.cancel(STATUS_TIMEOUT)
+            future.add_done_callback(_consume_exception)
+            run.results[stage.name] = token.partial_result
+            run.status[stage.name] = STATUS_TIMEOUT
+        except StageCancelled:
+            run.results[stage.name] = token.partial_result
+            run.status[stage.name] = token.cancel_reason() or STATUS_CANCELLED
+        except Exception as e:
+            print(f"Error in stage {stage.name}: {e}")
+            run.results[stage.name] = None
+            run.status[stage.name] = STATUS_ERROR
+            run.errors[stage.name] = str(e)
+            run.exceptions[stage.name] = e
+        finally:
+            if stage_started is not None:
+                run.timings_ms[stage.name] = round((time.perf_counter() - stage_started) * 1000, 1)
+
+    for stage in _topological_order(stages):
+        tasks[stage.name] = asyncio.ensure_future(execute(stage))
+    await asyncio.gather(*tasks.values())
+    run.total_ms = round((time.perf_counter() - started) * 1000, 1)
+    return run
+
+
+def _consume_exception(future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _topological_order(stages: Dict[str, Stage]):
+    ordered, visiting, visited = [], set(), set()
+
+    def visit(name: str, path: Optional[tuple] = ()):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage dependency cycle: {' -> '.join(path + (name,))}")
+        visiting.add(name)
+        for dep in stages[name].deps:
+            visit(dep, path + (name,))
+        visiting.discard(name)
+        visited.add(name)
+        ordered.append(stages[name])
+
+    for name in stages:
+        visit(name)
+    return ordered
@@ -0,0 +1,96 @@
+"""
+Preload-and-fork model sharing for multi-worker deployments.
+
+With PRELOAD_MODELS=true and gunicorn (see gunicorn.conf.py) every model is loaded once in
+the master process, the heap is frozen with gc.freeze() and the workers are forked from it,
+so the read-only weights are shared copy-on-write instead of loaded once per worker.
+Transformers reads safetensors checkpoints (memory-mapped) whenever a model ships them.
+
+Compare per-worker unique memory with preloading off and on:
+
+    python preload.py <gunicorn master pid>
+"""
+import gc
+import os
+import sys
+
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false").lower() == "true"
+
+MB = 1024 * 1024
+
+
+def memory_usage(pid="self") -> dict:
+    """RSS, PSS, USS (private pages) and shared bytes from /proc/<pid>/smaps_rollup; {} if unavailable"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def format_memory(usage: dict) -> str:
+    return ", ".join(f"{key} {value / MB:.0f} MB" for key, value in usage.items()) or "n/a"
+
+
+def preload_models(app_module):
+    """Load every model in this (master) process, then freeze the heap before workers fork.
+    No inference runs here: forking after torch has started its thread pools is unsafe."""
+    before = memory_usage()
+    try:
+        app_module.get_quiz_generator()
+        app_module.get_summarizer()
+        keyword_extractor = app_module.get_keyword_extractor()
+        if keyword_extractor is not None and hasattr(keyword_extractor, "_init_model"):
+            keyword_extractor._init_model()
+    except Exception as e:
+        print(f"Error preloading models: {e}")
+    # Objects that survive to here are never collected; freezing keeps the collector
+    # from touching (and so copying) their pages in every worker
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded models in master {os.getpid()}: {format_memory(before)} -> {format_memory(memory_usage())}")
+
+
+def child_pids(parent_pid: int):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # ppid is the 2nd field after the parenthesised command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent_pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def report(master_pid: int):
+    """Per-worker memory table; unique (USS) is what each extra worker really costs"""
+    rows = [("master", master_pid, memory_usage(master_pid))]
+    rows += [("worker", pid, memory_usage(pid)) for pid in child_pids(master_pid)]
+    print(f"{'process':<8} {'pid':>8} {'rss MB':>9} {'pss MB':>9} {'uss MB':>9} {'shared MB':>10}")
+    for role, pid, usage in rows:
+        print(f"{role:<8} {pid:>8} {usage.get('rss', 0) / MB:>9.0f} {usage.get('pss', 0) / MB:>9.0f} "
+              f"{usage.get('uss', 0) / MB:>9.0f} {usage.get('shared', 0) / MB:>10.0f}")
+    total_pss = sum(usage.get("pss", 0) for _, _, usage in rows)
+    print(f"total pss: {total_pss / MB:.0f} MB across {len(rows)} processes")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python preload.py <gunicorn master pid>")
+        sys.exit(1)
+    report(int(sys.argv[1]))
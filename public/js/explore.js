@@ -83,9 +83,7 @@ async function fetchAndDisplayDocuments() {
                         <i class="fas fa-eye"></i>
                         Preview
                     </button>
-                    <a href="/${
-                      doc.saved_path
-                    }" download class="btn btn-primary">
+                    <a href="${documentFileUrl(doc.id || doc._id, true)}" download class="btn btn-primary download-btn">
                         <i class="fas fa-download"></i>
                         Download
                     </a>
@@ -104,6 +102,8 @@ async function fetchAndDisplayDocuments() {
     attachCommentButtonListeners();
     attachVoteButtonListeners();
     attachPreviewButtonListeners();
+    attachDownloadButtonListeners();
+    subscribeToDocumentEvents(documents.map(doc => doc.id || doc._id).filter(Boolean).slice(0, 200));
   } catch (error) {
     console.error("Lỗi khi tải tài liệu:", error);
     container.innerHTML =
@@ -189,7 +189,7 @@ function closeCommentsModal() {
 /**
  * Load comments for a document
  */
-async function loadComments(docId) {
+async function loadComments(docId, cursor = null) {
   const commentsList = document.getElementById('commentsList');
   
   try {
@@ -202,7 +202,8 @@ async function loadComments(docId) {
       headers['Authorization'] = `Bearer ${token}`;
     }
     
-    const response = await fetch(`/api/documents/${docId}/comments`, {
+    const query = cursor ? `?before=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`/api/documents/${docId}/comments${query}`, {
       method: 'GET',
       headers: headers
     });
@@ -217,21 +218,38 @@ async function loadComments(docId) {
     }
     
     const comments = await response.json();
+    const nextCursor = response.headers.get('X-Next-Cursor');
     
-    if (!comments || comments.length === 0) {
+    if (!cursor && (!comments || comments.length === 0)) {
       commentsList.innerHTML = '<p class="no-comments">No comments yet. Be the first to comment!</p>';
       return;
     }
     
     // Display comments
-    commentsList.innerHTML = '';
+    if (!cursor) {
+      commentsList.innerHTML = '';
+    }
+    const loadMoreButton = commentsList.querySelector('.load-more-comments');
+    if (loadMoreButton) loadMoreButton.remove();
     comments.forEach(comment => {
+      if (comment.id) seenCommentIds.add(comment.id);
       const commentHTML = createCommentHTML(comment);
       commentsList.insertAdjacentHTML('beforeend', commentHTML);
     });
     
-    // Update comment count on the button
-    updateCommentCount(docId, comments.length);
+    if (nextCursor) {
+      const button = document.createElement('button');
+      button.type = 'button';
+      button.className = 'btn btn-secondary load-more-comments';
+      button.textContent = 'Load more comments';
+      button.addEventListener('click', () => {
+        button.disabled = true;
+        loadComments(docId, nextCursor);
+      });
+      commentsList.appendChild(button);
+    } else if (!cursor) {
+      updateCommentCount(docId, comments.length);
+    }
     
   } catch (error) {
     console.error('Error loading comments:', error);
@@ -247,7 +265,7 @@ function createCommentHTML(comment) {
   const formattedDate = date.toLocaleDateString() + ' ' + date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
   
   return `
-    <div class="comment-item">
+    <div class="comment-item" data-comment-id="${escapeHtml(comment.id || '')}">
       <div class="comment-avatar">
         <i class="fas fa-user"></i>
       </div>
@@ -348,6 +366,53 @@ async function toggleVote(docId, buttonElement) {
   }
 }
 
+let documentEvents = null;
+const seenCommentIds = new Set();
+
+function subscribeToDocumentEvents(docIds) {
+  if (documentEvents) {
+    documentEvents.close();
+    documentEvents = null;
+  }
+  if (!docIds.length || typeof EventSource === 'undefined') return;
+
+  documentEvents = new EventSource(`/api/events/documents?ids=${encodeURIComponent(docIds.join(','))}`);
+
+  documentEvents.addEventListener('vote', (event) => {
+    const data = JSON.parse(event.data);
+    const countSpan = document.querySelector(`.vote-btn[data-doc-id="${data.document_id}"] .vote-count`);
+    if (countSpan) {
+      countSpan.textContent = data.vote_count;
+    }
+  });
+
+  documentEvents.addEventListener('comment', (event) => {
+    const data = JSON.parse(event.data);
+    addCommentToView(data.document_id, data.comment, data.comment_count);
+  });
+}
+
+function addCommentToView(docId, comment, commentCount) {
+  if (commentCount !== undefined) {
+    updateCommentCount(docId, commentCount);
+  }
+  if (comment.id && seenCommentIds.has(comment.id)) return;
+  if (comment.id) seenCommentIds.add(comment.id);
+
+  const countSpan = document.querySelector(`.comment-btn[data-doc-id="${docId}"] .comment-count`);
+  if (countSpan && commentCount === undefined) {
+    countSpan.textContent = (parseInt(countSpan.textContent, 10) || 0) + 1;
+  }
+
+  const modal = document.getElementById('commentsModal');
+  if (!modal || !modal.classList.contains('active') || modal.dataset.docId !== docId) return;
+  const commentsList = document.getElementById('commentsList');
+  if (comment.id && commentsList.querySelector(`[data-comment-id="${comment.id}"]`)) return;
+  const placeholder = commentsList.querySelector('.no-comments, .loading-text');
+  if (placeholder) placeholder.remove();
+  commentsList.insertAdjacentHTML('afterbegin', createCommentHTML(comment));
+}
+
 /**
  * Update comment count on the button
  */
@@ -428,8 +493,7 @@ document.addEventListener('DOMContentLoaded', () => {
         // Clear form
         commentForm.reset();
         
-        // Reload comments
-        await loadComments(docId);
+        addCommentToView(docId, await response.json());
         
       } catch (error) {
         console.error('Error posting comment:', error);
@@ -475,6 +539,36 @@ function getIconForFile(contentType) {
   }
 }
 
+function documentFileUrl(docId, download = false) {
+  return `/api/documents/${docId}/file${download ? "?download=1" : ""}`;
+}
+
+function attachDownloadButtonListeners() {
+  document.querySelectorAll('.download-btn').forEach(link => {
+    link.addEventListener('click', downloadWithAuth);
+  });
+}
+
+async function downloadWithAuth(event) {
+  const token = getToken ? getToken() : null;
+  const url = this.getAttribute('href');
+  if (!token || !url.startsWith('/api/')) return;
+  event.preventDefault();
+  try {
+    const response = await fetch(url.replace(/\/file\?download=1$/, '/download-link'), {
+      method: 'POST',
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    if (!response.ok) {
+      throw new Error(`Download link failed: ${response.status}`);
+    }
+    const data = await response.json();
+    window.location.href = data.url;
+  } catch (error) {
+    window.location.href = url;
+  }
+}
+
 /**
  * Attach event listeners to all preview buttons
  */
@@ -511,8 +605,10 @@ async function openPreviewModal(docPath, docType, docId) {
   modal.classList.add('active');
   
   // Set download link
-  previewDownload.href = `/${docPath}`;
+  previewDownload.href = documentFileUrl(docId, true);
   previewDownload.download = docPath.split('/').pop();
+  previewDownload.onclick = downloadWithAuth;
+  const fileUrl = documentFileUrl(docId);
   
   // Reset content
   previewContent.innerHTML = '<p class="loading-text">Loading preview...</p>';
@@ -520,13 +616,13 @@ async function openPreviewModal(docPath, docType, docId) {
   
   // Load preview based on file type
   if (docType && docType.includes('pdf')) {
-    await loadPDFPreview(docPath, previewContent, previewControls);
+    await loadPDFPreview(fileUrl, previewContent, previewControls);
   } else if (docType && (docType.includes('word') || docType.includes('document'))) {
-    loadOtherFilePreview(docPath, previewContent, 'Word Document');
+    loadOtherFilePreview(fileUrl, previewContent, 'Word Document');
   } else if (docType && (docType.includes('presentation') || docType.includes('powerpoint'))) {
-    loadOtherFilePreview(docPath, previewContent, 'PowerPoint Presentation');
+    loadOtherFilePreview(fileUrl, previewContent, 'PowerPoint Presentation');
   } else if (docType && docType.includes('text')) {
-    loadTextPreview(docPath, previewContent);
+    loadTextPreview(fileUrl, previewContent);
   } else {
     previewContent.innerHTML = '<p class="error-text">Preview not available for this file type. Please download to view.</p>';
   }
@@ -535,14 +631,13 @@ async function openPreviewModal(docPath, docType, docId) {
 /**
  * Load PDF preview using PDF.js
  */
-async function loadPDFPreview(docPath, container, controlsContainer) {
+async function loadPDFPreview(fileUrl, container, controlsContainer) {
   try {
     // Set up PDF.js worker
     if (typeof pdfjsLib !== 'undefined') {
       pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
     }
     
-    const fileUrl = `/${docPath}`;
     container.dataset.fileUrl = fileUrl;
     
     const loadingTask = pdfjsLib.getDocument(fileUrl);
@@ -645,8 +740,7 @@ async function navigatePDFPage(container, direction) {
 /**
  * Load other file types (Word, PowerPoint) using iframe
  */
-function loadOtherFilePreview(docPath, container, fileType) {
-  const fileUrl = `/${docPath}`;
+function loadOtherFilePreview(fileUrl, container, fileType) {
   
   // For Word and PowerPoint, we'll use Google Docs Viewer or Office Online
   // For now, show a message with download option
@@ -663,9 +757,9 @@ function loadOtherFilePreview(docPath, container, fileType) {
 /**
  * Load text file preview
  */
-async function loadTextPreview(docPath, container) {
+async function loadTextPreview(fileUrl, container) {
   try {
-    const response = await fetch(`/${docPath}`);
+    const response = await fetch(fileUrl);
     if (!response.ok) {
       throw new Error('Failed to load text file');
     }
@@ -77,7 +77,7 @@ function createDocumentCard(doc) {
                 </div>
             </div>
             <div class="document-actions">
-                <a href="/${doc.saved_path}" download class="icon-btn" title="Download">
+                <a href="/api/documents/${doc.id || doc._id}/file?download=1" download class="icon-btn" title="Download">
                     <i class="fas fa-download"></i>
                 </a>
             </div>
@@ -254,7 +254,7 @@ function displayDocuments(documents, tabId) {
                 </div>
                 <div class="document-actions-large">
                     ${tabId === 'uploads' ? `
-                        <a href="/${doc.saved_path}" download class="btn btn-primary">
+                        <a href="/api/documents/${doc.id || doc._id}/file?download=1" download class="btn btn-primary">
                             <i class="fas fa-download"></i>
                             Download
                         </a>
@@ -262,7 +262,7 @@ function displayDocuments(documents, tabId) {
                             <i class="fas fa-trash"></i>
                         </button>
                     ` : `
-                        <a href="/${doc.saved_path}" download class="btn btn-primary">
+                        <a href="/api/documents/${doc.id || doc._id}/file?download=1" download class="btn btn-primary">
                             <i class="fas fa-download"></i>
                             Download
                         </a>
@@ -185,7 +185,7 @@ async function generateQuiz(numQuestions) {
             formData.append('include_summary', 'true');
             formData.append('include_keywords', 'true');
             
-            response = await fetch('/api/generate-quiz-from-file-complete', {
+            response = await fetch('/api/generate-quiz-from-file-complete/stream', {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${token}`
@@ -199,7 +199,7 @@ async function generateQuiz(numQuestions) {
                 include_keywords: true
             };
             
-            response = await fetch(`/api/documents/${selectedDocumentId}/process-pdf`, {
+            response = await fetch(`/api/documents/${selectedDocumentId}/process-pdf/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -231,16 +231,92 @@ async function generateQuiz(numQuestions) {
             throw new Error(errorMessage);
         }
 
-        processedData = await response.json();
-        generatedQuiz = processedData.quiz;
-        displayAllResults(processedData);
+        processedData = { summary: null, keywords: [], quiz: null, stageErrors: {} };
+        await readEventStream(response, (eventName, data) => {
+            if (eventName === 'meta') {
+                processedData.document_title = data.document_title;
+                processedData.quiz = {
+                    quiz_title: data.quiz_title,
+                    source_document: data.source_document,
+                    total_questions: 0,
+                    questions: [],
+                    streaming: true
+                };
+            } else if (eventName === 'summary') {
+                processedData.summary = data.summary;
+            } else if (eventName === 'keywords') {
+                processedData.keywords = data.keywords || [];
+            } else if (eventName === 'question' && processedData.quiz) {
+                processedData.quiz.questions.push(data);
+                processedData.quiz.total_questions = processedData.quiz.questions.length;
+            } else if (eventName === 'done' && processedData.quiz) {
+                processedData.quiz.streaming = false;
+            } else if (eventName === 'error') {
+                processedData.stageErrors[data.stage] = data.detail || 'This step failed';
+            } else if (eventName === 'timeout') {
+                processedData.stageErrors[data.stage] = data.partial
+                    ? 'Timed out. Showing the results that were ready.'
+                    : 'Timed out before this step finished.';
+            }
+            if (processedData.quiz) {
+                generatedQuiz = processedData.quiz;
+                displayAllResults(processedData);
+            }
+        });
+
+        if (!processedData.quiz) {
+            const stageError = Object.values(processedData.stageErrors)[0];
+            showProcessingError(stageError || 'Failed to process PDF');
+        } else if (processedData.quiz.streaming) {
+            processedData.quiz.streaming = false;
+            displayAllResults(processedData);
+        }
 
     } catch (error) {
         console.error('Error processing PDF:', error);
-        alert('Failed to process PDF: ' + error.message);
-        
-        document.getElementById('fileSelectionSection').style.display = 'block';
-        document.getElementById('loadingSection').style.display = 'none';
+        showProcessingError(error.message);
+    }
+}
+
+function showProcessingError(message) {
+    alert('Failed to process PDF: ' + message);
+    
+    document.getElementById('fileSelectionSection').style.display = 'block';
+    document.getElementById('loadingSection').style.display = 'none';
+}
+
+function stageErrorHtml(message) {
+    return message ? `<p class="error-text">${escapeHtml(message)}</p>` : '';
+}
+
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventName = 'message';
+            const dataLines = [];
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (dataLines.length > 0) {
+                onEvent(eventName, JSON.parse(dataLines.join('\n')));
+            }
+            boundary = buffer.indexOf('\n\n');
+        }
     }
 }
 
@@ -248,44 +324,50 @@ function displayAllResults(data) {
     document.getElementById('loadingSection').style.display = 'none';
     document.getElementById('quizResultsSection').style.display = 'block';
 
-    if (data.summary) {
+    const stageErrors = data.stageErrors || {};
+
+    if (data.summary || stageErrors.summary) {
         const summarySection = document.getElementById('summarySection');
         const summaryContent = document.getElementById('summaryContent');
         if (summarySection && summaryContent) {
             summarySection.style.display = 'block';
-            const escapedSummary = escapeHtml(data.summary);
-            const formattedSummary = escapedSummary.replace(/\n/g, '<br>');
-            summaryContent.innerHTML = `<div class="summary-text">${formattedSummary}</div>`;
+            let summaryHtml = '';
+            if (data.summary) {
+                const escapedSummary = escapeHtml(data.summary);
+                const formattedSummary = escapedSummary.replace(/\n/g, '<br>');
+                summaryHtml = `<div class="summary-text">${formattedSummary}</div>`;
+            }
+            summaryContent.innerHTML = summaryHtml + stageErrorHtml(stageErrors.summary);
         }
     } else {
         document.getElementById('summarySection').style.display = 'none';
     }
 
-    if (data.keywords && data.keywords.length > 0) {
+    if ((data.keywords && data.keywords.length > 0) || stageErrors.keywords) {
         const keywordsSection = document.getElementById('keywordsSection');
         const keywordsContent = document.getElementById('keywordsContent');
         if (keywordsSection && keywordsContent) {
             keywordsSection.style.display = 'block';
             let keywordsHtml = '<div class="keywords-list">';
-            data.keywords.forEach(keyword => {
+            (data.keywords || []).forEach(keyword => {
                 keywordsHtml += `<span class="keyword-tag">${escapeHtml(keyword)}</span>`;
             });
             keywordsHtml += '</div>';
-            keywordsContent.innerHTML = keywordsHtml;
+            keywordsContent.innerHTML = keywordsHtml + stageErrorHtml(stageErrors.keywords);
         }
     } else {
         document.getElementById('keywordsSection').style.display = 'none';
     }
 
     if (data.quiz) {
-        displayQuizResults(data.quiz);
+        displayQuizResults(data.quiz, stageErrors.quiz);
         document.getElementById('quizPreviewSection').style.display = 'block';
     } else {
         document.getElementById('quizPreviewSection').style.display = 'none';
     }
 }
 
-function displayQuizResults(quizData) {
+function displayQuizResults(quizData, stageError) {
     const quizPreview = document.getElementById('quizPreview');
     
     let html = `
@@ -323,10 +405,12 @@ function displayQuizResults(quizData) {
                 </div>
             `;
         });
-    } else {
-        html += '<p class="no-questions">No questions generated. Please try again.</p>';
+    } else if (!stageError) {
+        const emptyMessage = quizData.streaming ? 'Generating questions...' : 'No questions generated. Please try again.';
+        html += `<p class="no-questions">${emptyMessage}</p>`;
     }
 
+    html += stageErrorHtml(stageError);
     html += '</div>';
     quizPreview.innerHTML = html;
 }
@@ -182,7 +182,7 @@ function createDocumentCard(doc) {
                 </div>
             </div>
             <div class="document-actions-large">
-                <a href="/${doc.saved_path}" download class="btn btn-primary">
+                <a href="/api/documents/${doc.id || doc._id}/file?download=1" download class="btn btn-primary">
                     <i class="fas fa-download"></i>
                     Download
                 </a>
@@ -91,6 +91,138 @@ function formatFileSize(bytes) {
   return Math.round((bytes / Math.pow(k, i)) * 100) / 100 + " " + sizes[i];
 }
 
+const RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+function uploadHeaders(extra = {}) {
+  const token = localStorage.getItem("access_token");
+  return token ? { ...extra, Authorization: `Bearer ${token}` } : extra;
+}
+
+function resumeKey(file) {
+  return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function uploadErrorMessage(response) {
+  try {
+    const result = await response.json();
+    return result.detail || `Status: ${response.status}`;
+  } catch (err) {
+    return `Status: ${response.status}`;
+  }
+}
+
+function canResumeUploads() {
+  return Boolean(window.crypto && window.crypto.subtle);
+}
+
+async function sha256Hex(buffer) {
+  const digest = await window.crypto.subtle.digest("SHA-256", buffer);
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, "0"))
+    .join("");
+}
+
+async function openUploadSession(file, formData) {
+  const savedId = localStorage.getItem(resumeKey(file));
+  if (savedId) {
+    const response = await fetch(`/api/uploads/${savedId}`, {
+      headers: uploadHeaders(),
+    });
+    if (response.ok) {
+      const session = await response.json();
+      if (session.status === "uploading") return session;
+    }
+    localStorage.removeItem(resumeKey(file));
+  }
+
+  const body = {
+    filename: file.name,
+    size_bytes: file.size,
+    content_type: file.type || null,
+    sha256: await sha256Hex(await file.arrayBuffer()),
+  };
+  [
+    "university",
+    "faculty",
+    "course",
+    "documentTitle",
+    "description",
+    "documentType",
+    "tags",
+  ].forEach((field) => {
+    body[field] = formData.get(field) || "";
+  });
+
+  const response = await fetch("/api/uploads", {
+    method: "POST",
+    headers: uploadHeaders({ "Content-Type": "application/json" }),
+    body: JSON.stringify(body),
+  });
+  if (!response.ok) throw new Error(await uploadErrorMessage(response));
+  const session = await response.json();
+  localStorage.setItem(resumeKey(file), session.upload_id);
+  return session;
+}
+
+async function resumableUpload(file, formData, onProgress) {
+  const session = await openUploadSession(file, formData);
+  const chunkSize = session.chunk_size;
+  let offset = session.offset;
+  let failures = 0;
+  onProgress(offset);
+
+  while (offset < file.size) {
+    const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+    const checksum = await sha256Hex(chunk);
+    let response;
+    try {
+      response = await fetch(
+        `/api/uploads/${session.upload_id}?offset=${offset}`,
+        {
+          method: "PUT",
+          headers: uploadHeaders({ "X-Chunk-SHA256": checksum }),
+          body: chunk,
+        }
+      );
+    } catch (err) {
+      response = null;
+    }
+
+    if (response && response.ok) {
+      offset = (await response.json()).offset;
+      failures = 0;
+      onProgress(offset);
+      continue;
+    }
+    if (response && response.status === 409 && response.headers.get("Upload-Offset")) {
+      offset = parseInt(response.headers.get("Upload-Offset"), 10);
+      continue;
+    }
+    if (response && ![408, 422, 429].includes(response.status) && response.status < 500) {
+      localStorage.removeItem(resumeKey(file));
+      throw new Error(await uploadErrorMessage(response));
+    }
+    failures += 1;
+    if (failures > UPLOAD_MAX_RETRIES) {
+      throw new Error("Lỗi mạng. Hãy thử upload lại để tiếp tục từ chỗ đã dừng.");
+    }
+    await sleep(Math.min(30000, 1000 * 2 ** failures));
+  }
+
+  const response = await fetch(`/api/uploads/${session.upload_id}/finalize`, {
+    method: "POST",
+    headers: uploadHeaders(),
+  });
+  if (!response.ok) throw new Error(await uploadErrorMessage(response));
+  localStorage.removeItem(resumeKey(file));
+  return response.json();
+}
+
 // Load universities and majors from JSON
 async function loadUniversitiesAndMajors() {
   if (!universitySelect || !facultySelect) return;
@@ -250,6 +382,30 @@ if (uploadForm) {
     submitButton.innerHTML =
       '<i class="fas fa-spinner fa-spin"></i> Uploading...';
 
+    if (file.size > RESUMABLE_UPLOAD_THRESHOLD && canResumeUploads()) {
+      try {
+        const result = await resumableUpload(file, formData, (loaded) => {
+          const percentComplete = (loaded / file.size) * 100;
+          if (progressFill) progressFill.style.width = percentComplete + "%";
+          if (progressText)
+            progressText.textContent = Math.round(percentComplete) + "%";
+        });
+        alert(`Thành công! File "${result.filename}" đã được upload.`);
+        uploadForm.reset();
+        resetDropzone();
+        loadMajorsForUniversity(null);
+        courseCustomInput.style.display = "none";
+      } catch (err) {
+        alert(`Lỗi: ${err.message || "Không thể upload file."}`);
+        if (progressFill) progressFill.style.backgroundColor = "#e74c3c";
+        if (progressText) progressText.textContent = "Upload Failed";
+      } finally {
+        submitButton.disabled = false;
+        submitButton.innerHTML = '<i class="fas fa-upload"></i> Upload Document';
+      }
+      return;
+    }
+
     // 6. Gửi bằng XMLHttpRequest (XHR) để có tiến trình upload
     const xhr = new XMLHttpRequest();
     xhr.open("POST", "/uploadfile/", true); // Gửi đến endpoint của FastAPI
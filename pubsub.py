@@ -0,0 +1,131 @@
+"""
+Publish/subscribe for live document events (vote counts, new comments).
+
+PUBSUB_BACKEND=local (the default) fans events out inside this process, which is all a single
+worker needs. With several workers or nodes set PUBSUB_BACKEND=redis (and PUBSUB_REDIS_URL):
+events are relayed through Redis so a vote handled by one worker reaches viewers connected
+to another. Both expose the same subscribe/publish calls.
+"""
+import os
+import json
+import asyncio
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local").lower()
+PUBSUB_REDIS_URL = os.getenv("PUBSUB_REDIS_URL", "redis://localhost:6379/0")
+# Events buffered per subscriber; a stalled client loses its oldest events, never blocks publishers
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, bus: "LocalBus", channels: Iterable[str], max_queue: int = SUBSCRIBER_QUEUE_SIZE):
+        self.bus = bus
+        self.channels = set(channels)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def deliver(self, channel: str, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((channel, event))
+
+    async def get(self, timeout: float) -> Optional[Tuple[str, dict]]:
+        """Next (channel, event), or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class LocalBus:
+    """In-process fan-out; also the local delivery half of every other backend."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, channels)
+        for channel in subscription.channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    async def publish(self, channel: str, event: dict):
+        self.deliver(channel, event)
+
+    def deliver(self, channel: str, event: dict):
+        for subscription in list(self._subscribers.get(channel, ())):
+            subscription.deliver(channel, event)
+
+    def subscriber_count(self) -> int:
+        return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+
+class RedisBus(LocalBus):
+    """Publishes through Redis; one pattern subscription per process delivers to local subscribers."""
+
+    def __init__(self, url: str = PUBSUB_REDIS_URL, prefix: str = "unihub:"):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self._redis = None
+        self._pubsub = None
+        self._listener = None
+
+    async def start(self):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self.prefix}*")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        if self._pubsub:
+            await self._pubsub.aclose()
+        if self._redis:
+            await self._redis.aclose()
+
+    async def publish(self, channel: str, event: dict):
+        await self._redis.publish(f"{self.prefix}{channel}", json.dumps(event, default=str))
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self.deliver(channel[len(self.prefix):], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in Redis event listener, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+
+def create_bus(backend: str = PUBSUB_BACKEND) -> LocalBus:
+    if backend == "redis":
+        return RedisBus()
+    return LocalBus()
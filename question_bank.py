@@ -0,0 +1,70 @@
+import os
+import random
+import hashlib
+from collections import defaultdict, deque
+from typing import List, Dict, Any
+
+QUESTION_BANK_SIZE = int(os.getenv("QUESTION_BANK_SIZE", "50"))
+QUESTION_BANK_ROUNDS = int(os.getenv("QUESTION_BANK_ROUNDS", "3"))
+
+
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_question_bank(generator, text: str, size: int = QUESTION_BANK_SIZE,
+                        rounds: int = QUESTION_BANK_ROUNDS) -> List[Dict[str, Any]]:
+    """Run the quiz generator a few times and keep every distinct question it produced"""
+    bank, seen = [], set()
+    for _ in range(rounds):
+        quiz_data = generator.generate_complete_quiz(text, num_questions=size)
+        added = 0
+        for q in quiz_data.get("questions", []):
+            key = q["question"].strip().lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            bank.append(q)
+            added += 1
+        if not added:
+            break
+    for i, q in enumerate(bank, 1):
+        q["id"] = i
+    return bank
+
+
+def sample_balanced(questions: List[Dict[str, Any]], num_questions: int, rng: random.Random = None) -> List[Dict[str, Any]]:
+    """
+    Sample questions round-robin across question types (and concepts within a type),
+    so a short quiz still covers as many kinds of question as the bank holds.
+    """
+    rng = rng or random.Random()
+    groups = defaultdict(lambda: defaultdict(list))
+    for q in questions:
+        groups[q.get("type", "")][q.get("concept", "")].append(q)
+
+    queues = []
+    for by_concept in groups.values():
+        for pool in by_concept.values():
+            rng.shuffle(pool)
+        concept_queues = [deque(pool) for pool in by_concept.values()]
+        rng.shuffle(concept_queues)
+        queues.append(deque(concept_queues))
+    rng.shuffle(queues)
+
+    sampled = []
+    while queues and len(sampled) < num_questions:
+        type_queue = queues.pop(0)
+        concept_queue = type_queue.popleft()
+        sampled.append(concept_queue.popleft())
+        if concept_queue:
+            type_queue.append(concept_queue)
+        if type_queue:
+            queues.append(type_queue)
+
+    return [{**q, "id": i} for i, q in enumerate(sampled, 1)]
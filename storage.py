@@ -0,0 +1,217 @@
+import os
+import time
+import shutil
+import uuid
+import hashlib
+from typing import NamedTuple, Optional, Union
+
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Uploads processed without being stored stay in memory up to this size, then spill to a temp file
+UPLOAD_MEMORY_MAX_BYTES = int(os.getenv("UPLOAD_MEMORY_MAX_BYTES", str(4 * 1024 * 1024)))
+# Unfinished temp files older than this are swept by garbage collection
+STALE_TEMP_SECONDS = 24 * 3600
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File exceeds the {max_bytes / (1024 * 1024):.0f} MB upload limit")
+        self.max_bytes = max_bytes
+
+
+class StagedFile(NamedTuple):
+    """A fully written, hashed upload still under its temporary name"""
+    temp_path: str
+    sha256: str
+    size: int
+    extension: str
+
+
+def file_extension(filename: str) -> str:
+    return os.path.splitext(filename or "")[1].lower()
+
+
+def blob_path(root: str, sha256: str, extension: str = "") -> str:
+    """root/ab/cd/abcd...<ext>: two 256-way levels keep every directory small even with
+    hundreds of thousands of blobs"""
+    return os.path.join(root, sha256[:2], sha256[2:4], f"{sha256}{extension}").replace("\\", "/")
+
+
+def _hash_and_write(digest, out, chunk: bytes):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def stage_upload(upload, root: str, max_bytes: int = UPLOAD_MAX_BYTES) -> StagedFile:
+    """
+    Copy an UploadFile to a temp file under root in chunks off the event loop, hashing as it
+    goes and failing fast past max_bytes. commit_staged() then moves it to its blob path.
+    """
+    tmp_dir = os.path.join(root, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    temp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        try:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                await run_in_threadpool(_hash_and_write, digest, out, chunk)
+        finally:
+            await run_in_threadpool(out.close)
+        return StagedFile(temp_path, digest.hexdigest(), size, file_extension(upload.filename))
+    except BaseException:
+        discard_staged(temp_path)
+        raise
+
+
+def _write_at(path: str, offset: int, chunk: bytes):
+    with open(path, "r+b") as out:
+        out.seek(offset)
+        out.write(chunk)
+
+
+async def write_chunk(path: str, offset: int, stream, limit: int):
+    """
+    Write a request body stream into an upload session file at offset, refusing to go past
+    limit bytes in total. Returns (bytes written, sha256 of the chunk) so the caller can check
+    it against the client's digest before advancing the session offset.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    async for chunk in stream:
+        if not chunk:
+            continue
+        if offset + written + len(chunk) > limit:
+            raise UploadTooLarge(limit)
+        digest.update(chunk)
+        await run_in_threadpool(_write_at, path, offset + written, chunk)
+        written += len(chunk)
+    return written, digest.hexdigest()
+
+
+class BufferedUpload(NamedTuple):
+    """An upload read for one-off processing: in memory (data) or spilled to a temp file (path)"""
+    data: Optional[bytes]
+    path: Optional[str]
+    sha256: str
+    size: int
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """What PDF readers get: the bytes themselves, or the spill file's path"""
+        return self.data if self.path is None else self.path
+
+    def discard(self):
+        if self.path:
+            discard_staged(self.path)
+
+
+async def buffer_upload(upload, root: str, memory_max_bytes: int = UPLOAD_MEMORY_MAX_BYTES,
+                        max_bytes: int = UPLOAD_MAX_BYTES) -> BufferedUpload:
+    """
+    Read an UploadFile into memory, hashing as it goes. Past memory_max_bytes the data moves to
+    a uniquely named temp file under root/tmp (swept if the process dies), so concurrent
+    uploads of the same filename never collide and large files don't sit in RAM.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    temp_path = None
+    out = None
+    try:
+        try:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                if out is None and size > memory_max_bytes:
+                    tmp_dir = os.path.join(root, "tmp")
+                    os.makedirs(tmp_dir, exist_ok=True)
+                    temp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+                    out = await run_in_threadpool(open, temp_path, "wb")
+                    await run_in_threadpool(out.writelines, chunks)
+                    chunks = []
+                if out is None:
+                    digest.update(chunk)
+                    chunks.append(chunk)
+                else:
+                    await run_in_threadpool(_hash_and_write, digest, out, chunk)
+        finally:
+            if out is not None:
+                await run_in_threadpool(out.close)
+        data = b"".join(chunks) if temp_path is None else None
+        return BufferedUpload(data, temp_path, digest.hexdigest(), size)
+    except BaseException:
+        if temp_path:
+            discard_staged(temp_path)
+        raise
+
+
+def commit_staged(temp_path: str, final_path: str, keep_temp: bool = False):
+    """Atomically move a staged file into place; identical content already there is kept as is.
+    With keep_temp the staged file is hard-linked (or copied) instead and left where it is."""
+    if os.path.exists(final_path):
+        if not keep_temp:
+            discard_staged(temp_path)
+        return
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    if keep_temp:
+        try:
+            os.link(temp_path, final_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hard links on this filesystem: copy beside the target, then rename into place
+            copy_path = f"{final_path}.{uuid.uuid4().hex}.part"
+            shutil.copyfile(temp_path, copy_path)
+            os.replace(copy_path, final_path)
+        return
+    # os.replace is atomic within one filesystem; readers never see a partial file
+    os.replace(temp_path, final_path)
+
+
+def discard_staged(temp_path: str):
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def remove_blob_file(path: str) -> int:
+    """Delete a blob file and return the bytes freed (0 if it was already gone)"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except OSError:
+        return 0
+
+
+def sweep_stale_temp(root: str, max_age: float = STALE_TEMP_SECONDS) -> int:
+    """Remove temp files left behind by crashed uploads"""
+    tmp_dir = os.path.join(root, "tmp")
+    if not os.path.isdir(tmp_dir):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    with os.scandir(tmp_dir) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
@@ -1,28 +1,55 @@
 # ...existing code...
-import fitz
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-import nltk
-from nltk.tokenize import sent_tokenize
-import torch
 import re
 import os
-import time
-from deep_translator import GoogleTranslator
+from translation import Translator, get_backend
+from text_chunker import TokenChunker, split_sentences
+from pipeline import stopping_criteria
+
+EXPANSION_PREFIX = "Elaborate on this text and provide more details: "
+TRANSLATION_CHUNK_CHARS = 4000
+# Pre-provisioned NLTK data (python -m nltk.downloader -d nltk_data punkt punkt_tab); never downloaded at runtime
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
 
 def translate_text(text, src="en", dest="vi"):
-    return GoogleTranslator(source=src, target=dest).translate(text)
+    return get_backend().translate(text, src, dest)
+
+_sent_tokenize = None
 
-nltk.download('punkt', quiet=True)
+def sent_tokenize(text):
+    """NLTK punkt when its data is available locally, otherwise the regex splitter"""
+    global _sent_tokenize
+    if _sent_tokenize is None:
+        try:
+            import nltk
+            if NLTK_DATA_DIR not in nltk.data.path:
+                nltk.data.path.insert(0, NLTK_DATA_DIR)
+            from nltk.tokenize import sent_tokenize as nltk_sent_tokenize
+            nltk_sent_tokenize("Punkt check. Done.")
+            _sent_tokenize = nltk_sent_tokenize
+        except (ImportError, LookupError):
+            print("Warning: NLTK punkt data not found, using the regex sentence splitter")
+            _sent_tokenize = split_sentences
+    return _sent_tokenize(text)
 
 class ExtendedLectureSummarizer:
-    def __init__(self):
+    def __init__(self, translator=None):
+        import torch
+        from transformers import T5Tokenizer, T5ForConditionalGeneration
+
+        self.translator = translator or Translator()
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.expansion_tokenizer = T5Tokenizer.from_pretrained("t5-base")
         self.expansion_model = T5ForConditionalGeneration.from_pretrained("t5-base").to(self.device)
+        self.chunker = TokenChunker(self.expansion_tokenizer, max_tokens=512)
 
     def extract_text_from_pdf(self, file_path):
+        """file_path may also be the PDF's bytes"""
         try:
-            doc = fitz.open(file_path)
+            import fitz
+            if isinstance(file_path, (bytes, bytearray)):
+                doc = fitz.open(stream=file_path, filetype="pdf")
+            else:
+                doc = fitz.open(file_path)
             text = ""
             for page in doc:
                 text += page.get_text()
@@ -31,12 +58,18 @@ class ExtendedLectureSummarizer:
         except Exception:
             return ""
 
-    def expand_with_t5(self, text):
+    def expand_with_t5(self, text, cancel_token=None):
         try:
-            prompt = "Elaborate on this text and provide more details: " + text[:500]
-            inputs = self.expansion_tokenizer.encode(prompt, return_tensors="pt", max_length=512, truncation=True).to(self.device)
+            # Fill the 512-token context exactly and reuse the cached ids instead of re-tokenizing
+            chunks = self.chunker.chunk(text, prefix=EXPANSION_PREFIX, max_chunks=1)
+            if not chunks:
+                return text
+            import torch
+            input_ids = self.chunker.build_input_ids(chunks[0], prefix=EXPANSION_PREFIX)
+            inputs = torch.tensor([input_ids], device=self.device)
             outputs = self.expansion_model.generate(
-                inputs, max_length=280, min_length=100, num_beams=4, early_stopping=True, no_repeat_ngram_size=3
+                inputs, max_length=280, min_length=100, num_beams=4, early_stopping=True, no_repeat_ngram_size=3,
+                stopping_criteria=stopping_criteria(cancel_token)
             )
             return self.expansion_tokenizer.decode(outputs[0], skip_special_tokens=True)
         except Exception:
@@ -72,9 +105,9 @@ class ExtendedLectureSummarizer:
 
         return "\n".join(parts)
 
-    def comprehensive_expansion(self, text):
+    def comprehensive_expansion(self, text, cancel_token=None):
         detailed = self.create_detailed_explanation(text)
-        expanded_t5 = self.expand_with_t5(text)
+        expanded_t5 = self.expand_with_t5(text, cancel_token)
 
         return f"""DETAILED SUMMARY
 
@@ -87,57 +120,46 @@ CONCLUSION:
 This document covers essential concepts with practical applications in multiple domains. Further analysis can enhance understanding and implementation."""
 
     @staticmethod
-    def split_text_into_chunks(text, max_chunk_size=4000):
+    def split_text_into_chunks(text, max_chunk_size=TRANSLATION_CHUNK_CHARS):
         """
-        Chia văn bản thành các phần nhỏ để phù hợp với giới hạn của Google Translate
+        Chia văn bản thành các phần nhỏ theo câu để phù hợp với giới hạn ký tự của Google Translate
         """
-        chunks = []
-        paragraphs = text.split('\n')
-        current_chunk = ""
-
-        for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) > max_chunk_size:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = ""
-            current_chunk += paragraph + "\n"
-
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-
-        return chunks
+        chunker = TokenChunker(max_tokens=max_chunk_size)
+        return [chunk.text for chunk in chunker.chunk(text, respect_sentences=True)]
 
-    def translate_vietnamese_to_english(self, text):
+    def translate_vietnamese_to_english(self, text, cancel_token=None):
         """
-        Dịch văn bản tiếng Việt sang tiếng Anh sử dụng googletrans với chia chunk để tránh giới hạn
+        Dịch văn bản tiếng Việt sang tiếng Anh qua translation backend, các chunk được dịch song song
+        và lưu cache; bỏ qua nếu văn bản đã là tiếng Anh
         """
         try:
-            translator = Translator()
+            if not self.translator.needs_translation(text, "en"):
+                print("⏭️ Text is already English, skipping translation")
+                return text
             chunks = self.split_text_into_chunks(text)
-            translated_chunks = []
-
-            for i, chunk in enumerate(chunks):
-                # in log để debug nếu cần
-                print(f"🔄 Translating chunk {i+1}/{len(chunks)}...")
-                translated = translate_text(text, src="en", dest="vi")
-                translated_chunks.append(translated.text)
-                time.sleep(1)  # tránh bị block / rate-limit
-
-            full_translation = " ".join(translated_chunks)
+            print(f"🔄 Translating {len(chunks)} chunks...")
+            full_translation = self.translator.translate(text, src="vi", dest="en", chunks=chunks, cancel_token=cancel_token)
             print("✅ Translation finished")
             return full_translation
         except Exception as e:
             print(f"❌ Translation error: {e}")
             return None
 
-    def process(self, file_path):
-        text = self.extract_text_from_pdf(file_path)
+    def process(self, file_path, cancel_token=None):
+        return self.process_text(self.extract_text_from_pdf(file_path), cancel_token)
+
+    def process_text(self, text, cancel_token=None):
+        """Summarise already extracted text, so callers that have it don't parse the PDF again"""
         if not text or len(text) < 50:
             return None
 
         text = re.sub(r'\s+', ' ', text).strip()
-        vn_summary = self.comprehensive_expansion(text)
-        en_summary = self.translate_vietnamese_to_english(vn_summary) or vn_summary
+        vn_summary = self.comprehensive_expansion(text, cancel_token)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        en_summary = self.translate_vietnamese_to_english(vn_summary, cancel_token) or vn_summary
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
 
         return {
             'english': en_summary,
@@ -153,9 +175,15 @@ This document covers essential concepts with practical applications in multiple
             f.write(data['english'])
         print(f"Saved (English only): {output_file}")
 
-    def get_summary_text(self, file_path):
-        """Trả về text summary mà không cần lưu file"""
-        result = self.process(file_path)
+    def get_summary_text(self, file_path, cancel_token=None):
+        """Trả về text summary mà không cần lưu file; dừng sớm khi cancel_token bị huỷ"""
+        result = self.process(file_path, cancel_token)
+        if result:
+            return result['english']
+        return None
+
+    def summarize_text(self, text, cancel_token=None):
+        result = self.process_text(text, cancel_token)
         if result:
             return result['english']
         return None
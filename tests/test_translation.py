@@ -0,0 +1,105 @@
+import pytest
+
+import translation
+from translation import OfflineTranslationBackend, TranslationCache, Translator
+
+VIETNAMESE = "Khai phá dữ liệu là quá trình tìm kiếm tri thức từ dữ liệu lớn."
+ENGLISH = "Data mining is the process of discovering knowledge from large data."
+
+
+class FlakyBackend(OfflineTranslationBackend):
+    """Offline backend that fails the first `failures` calls"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def translate(self, text, src, dest):
+        if self.failures:
+            self.failures -= 1
+            self.calls.append((src, dest, text))
+            raise ConnectionError("temporary failure")
+        return super().translate(text, src, dest)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranslationCache(str(tmp_path / "translations.sqlite3"))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(translation.time, "sleep", delays.append)
+    monkeypatch.setattr(translation.random, "random", lambda: 0.0)
+    return delays
+
+
+def test_cache_miss_calls_backend_then_hit_does_not(cache):
+    backend = OfflineTranslationBackend(glossary={"dữ liệu": "data"})
+    translator = Translator(backend=backend, cache=cache, max_workers=1)
+
+    first = translator.translate(VIETNAMESE, "vi", "en")
+    second = translator.translate(VIETNAMESE, "vi", "en")
+
+    assert first == second == VIETNAMESE.replace("dữ liệu", "data")
+    assert len(backend.calls) == 1
+    assert cache.get(VIETNAMESE, "vi", "en") == first
+
+
+def test_cache_is_keyed_by_language_pair(cache):
+    cache.set(VIETNAMESE, "vi", "en", "english")
+    assert cache.get(VIETNAMESE, "vi", "en") == "english"
+    assert cache.get(VIETNAMESE, "vi", "fr") is None
+
+
+def test_cache_reconnects_after_fork(cache, monkeypatch):
+    cache.set(VIETNAMESE, "vi", "en", "english")
+    connection = cache._conn
+    child_pid = cache._pid + 1
+    monkeypatch.setattr(translation.os, "getpid", lambda: child_pid)
+
+    assert cache.get(VIETNAMESE, "vi", "en") == "english"
+    assert cache._conn is not connection
+    assert cache._pid == child_pid
+
+
+def test_text_already_in_target_language_is_skipped(cache):
+    backend = OfflineTranslationBackend()
+    translator = Translator(backend=backend, cache=cache, max_workers=1)
+
+    assert translator.translate(ENGLISH, "vi", "en") == ENGLISH
+    assert translator.translate(VIETNAMESE, "en", "vi") == VIETNAMESE
+    assert translator.translate("   ", "vi", "en") == "   "
+    assert backend.calls == []
+
+
+def test_only_chunks_needing_translation_reach_backend(cache):
+    backend = OfflineTranslationBackend()
+    translator = Translator(backend=backend, cache=cache, max_workers=2)
+
+    result = translator.translate(VIETNAMESE + " " + ENGLISH, "vi", "en", chunks=[VIETNAMESE, ENGLISH])
+
+    assert result == VIETNAMESE + " " + ENGLISH
+    assert [text for _, _, text in backend.calls] == [VIETNAMESE]
+
+
+def test_transient_errors_are_retried_with_exponential_backoff(cache, sleeps):
+    backend = FlakyBackend(failures=2)
+    translator = Translator(backend=backend, cache=cache, max_workers=1, max_retries=3, backoff_base=0.5)
+
+    assert translator.translate(VIETNAMESE, "vi", "en") == VIETNAMESE
+    assert len(backend.calls) == 3
+    assert sleeps == [0.5, 1.0]
+    assert cache.get(VIETNAMESE, "vi", "en") == VIETNAMESE
+
+
+def test_gives_up_after_max_retries_without_caching(cache, sleeps):
+    backend = FlakyBackend(failures=10)
+    translator = Translator(backend=backend, cache=cache, max_workers=1, max_retries=2, backoff_base=0.5)
+
+    with pytest.raises(ConnectionError):
+        translator.translate(VIETNAMESE, "vi", "en")
+    assert len(backend.calls) == 3
+    assert sleeps == [0.5, 1.0]
+    assert cache.get(VIETNAMESE, "vi", "en") is None
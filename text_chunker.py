@@ -0,0 +1,127 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+
+class TokenChunk:
+    """A slice of text together with the token ids it was measured with (None in character mode)."""
+    __slots__ = ("text", "input_ids")
+
+    def __init__(self, text: str, input_ids: Optional[List[int]] = None):
+        self.text = text
+        self.input_ids = input_ids
+
+    def __len__(self):
+        return len(self.input_ids) if self.input_ids is not None else len(self.text)
+
+
+class TokenChunker:
+    """
+    Packs sentences into chunks that fill a model context.
+
+    With a Hugging Face tokenizer lengths are counted in tokens and every sentence is
+    tokenized once (LRU-cached), so chunk ids can be fed to the model as-is. Without a
+    tokenizer lengths are counted in characters, which is what Google Translate limits.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: int = 512, overlap: int = 0, cache_size: int = 4096):
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def special_token_count(self) -> int:
+        if self.tokenizer is None or self.tokenizer.eos_token_id is None:
+            return 0
+        return 1
+
+    def encode(self, sentence: str) -> List[int]:
+        with self._cache_lock:
+            ids = self._cache.get(sentence)
+            if ids is not None:
+                self._cache.move_to_end(sentence)
+                return ids
+        # Tokenized outside the lock; two threads missing on one sentence just both encode it
+        ids = self.tokenizer.encode(sentence, add_special_tokens=False)
+        with self._cache_lock:
+            self._cache[sentence] = ids
+            self._cache.move_to_end(sentence)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return ids
+
+    def build_input_ids(self, chunk: TokenChunk, prefix: str = "") -> List[int]:
+        """Prefix ids + chunk ids + EOS, ready to wrap in a tensor without re-tokenizing."""
+        ids = (self.encode(prefix) if prefix else []) + list(chunk.input_ids)
+        if self.special_token_count:
+            ids.append(self.tokenizer.eos_token_id)
+        return ids
+
+    def chunk(self, text: str, prefix: str = "", respect_sentences: bool = False,
+              max_chunks: Optional[int] = None) -> List[TokenChunk]:
+        """
+        Split text so each chunk (plus prefix and special tokens) fits max_tokens.
+
+        By default chunks are filled to the exact budget, cutting a sentence at the token
+        boundary where needed; respect_sentences only breaks between sentences unless a
+        single sentence is longer than the budget.
+        """
+        if self.tokenizer is None:
+            return self._chunk_chars(text, respect_sentences, max_chunks)
+        budget = self.max_tokens - self.special_token_count - (len(self.encode(prefix)) if prefix else 0)
+        if budget <= self.overlap:
+            raise ValueError("prefix leaves no room for content")
+
+        chunks, current = [], []
+
+        def emit():
+            chunks.append(TokenChunk(self.tokenizer.decode(current, skip_special_tokens=True), list(current)))
+            return current[-self.overlap:] if self.overlap else []
+
+        for sentence in split_sentences(text):
+            ids = self.encode(sentence)
+            if respect_sentences and current and len(current) + len(ids) > budget:
+                current = emit()
+            while len(current) + len(ids) > budget:
+                room = budget - len(current)
+                current = current + ids[:room]
+                ids = ids[room:]
+                current = emit()
+                if max_chunks and len(chunks) >= max_chunks:
+                    return chunks
+            current = current + ids
+        if len(current) > (self.overlap if chunks else 0):
+            emit()
+        return chunks[:max_chunks] if max_chunks else chunks
+
+    def _chunk_chars(self, text: str, respect_sentences: bool, max_chunks: Optional[int]) -> List[TokenChunk]:
+        chunks, current = [], ""
+        pieces = split_sentences(text) if respect_sentences else [text]
+        for piece in pieces:
+            while len(piece) > self.max_tokens:
+                if current:
+                    chunks.append(TokenChunk(current))
+                    current = ""
+                chunks.append(TokenChunk(piece[:self.max_tokens]))
+                piece = piece[self.max_tokens - self.overlap:]
+            if current and len(current) + len(piece) + 1 > self.max_tokens:
+                chunks.append(TokenChunk(current))
+                current = current[-self.overlap:] if self.overlap else ""
+                if len(current) + len(piece) + 1 > self.max_tokens:
+                    current = ""
+            current = f"{current} {piece}" if current else piece
+        if current:
+            chunks.append(TokenChunk(current))
+        return chunks[:max_chunks] if max_chunks else chunks
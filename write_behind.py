@@ -0,0 +1,105 @@
+"""
+Write-behind buffering for high-volume, low-value writes such as download clicks.
+
+Writes are kept in memory keyed by what they touch, so a burst of clicks on the same item
+collapses into its final state, and are flushed every few seconds (or once enough pile up)
+as one batch. A process crash loses at most one interval of tracking data. While the database
+is down, flushes back off and a write is dropped (and counted) after max_attempts failed
+flushes or once max_retained writes are already waiting, so the buffer cannot grow unbounded.
+"""
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+WRITE_BEHIND_INTERVAL_SECONDS = float(os.getenv("WRITE_BEHIND_INTERVAL_SECONDS", "2"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "500"))
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+WRITE_BEHIND_MAX_RETAINED = int(os.getenv("WRITE_BEHIND_MAX_RETAINED", "10000"))
+WRITE_BEHIND_MAX_BACKOFF_SECONDS = float(os.getenv("WRITE_BEHIND_MAX_BACKOFF_SECONDS", "60"))
+
+
+class WriteBehindBuffer:
+    """Latest value per key, handed to flush_func as [(key, value), ...] in batches."""
+
+    def __init__(self, name: str, flush_func: Callable[[List[Tuple[Hashable, Any]]], Awaitable[None]],
+                 interval: float = WRITE_BEHIND_INTERVAL_SECONDS, max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS, max_retained: int = WRITE_BEHIND_MAX_RETAINED,
+                 max_backoff: float = WRITE_BEHIND_MAX_BACKOFF_SECONDS):
+        self.name = name
+        self.flush_func = flush_func
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.max_retained = max_retained
+        self.max_backoff = max_backoff
+        self.dropped = 0
+        self._pending: Dict[Hashable, Any] = {}
+        self._attempts: Dict[Hashable, int] = {}  # failed flushes of each pending write
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def put(self, key: Hashable, value: Any):
+        """Queue a write; a later write for the same key replaces the earlier one"""
+        self._pending.pop(key, None)
+        self._pending[key] = value
+        self._attempts.pop(key, None)
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """The pending value for a key, so reads can see writes that are not flushed yet"""
+        return self._pending.get(key, default)
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write everything pending now; on failure the batch is kept for the next attempt"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                await self.flush_func(list(batch.items()))
+            except BaseException:
+                self._requeue(batch)
+                raise
+            for key in batch:
+                self._attempts.pop(key, None)
+            return len(batch)
+
+    def _requeue(self, batch: Dict[Hashable, Any]):
+        dropped = 0
+        for key, value in batch.items():
+            # Newer writes that arrived during the flush win over the failed ones
+            if key in self._pending:
+                continue
+            attempts = self._attempts.pop(key, 0) + 1
+            if attempts >= self.max_attempts or len(self._pending) >= self.max_retained:
+                dropped += 1
+                continue
+            self._attempts[key] = attempts
+            self._pending[key] = value
+        if dropped:
+            self.dropped += dropped
+            print(f"Dropped {dropped} {self.name} writes after failed flushes ({self.dropped} in total)")
+
+    async def run(self):
+        """Background flush loop; cancel it, then call flush() once more on shutdown"""
+        failures = 0
+        while True:
+            if failures:
+                # Back off instead of retrying the whole backlog every interval
+                await asyncio.sleep(min(self.interval * 2 ** min(failures, 16), self.max_backoff))
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"Error flushing {self.name} writes: {e}")